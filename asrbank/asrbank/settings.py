@@ -56,6 +56,26 @@ FORCE_SCRIPT_NAME = ADMIN_SITE_URL
 
 XSD_NAME = "OralHistoryInterview.xsd.txt"
 
+# Number of worker processes that validate and serialize XML in bulk exports (1: no workers).
+# Each process that exports (web server, job worker) starts its own pool, so raise this
+# only where there are cores to spare, e.g. for manage.py publish --jobs
+EXPORT_JOBS = 1
+# Scheme and host used for the ResourceRef when publishing outside the web tier (manage.py publish)
+PUBLISH_BASE_URL = "http://applejack.science.ru.nl"
+
+# Who sends published XML and archives to the client:
+#   "python"           - the Django worker itself (development server)
+#   "x-sendfile"       - the front-end server, through X-Sendfile (Apache mod_xsendfile, lighttpd)
+#   "x-accel-redirect" - nginx, through X-Accel-Redirect: FILE_DELIVERY_URL must be an internal
+#                        location that serves FILE_DELIVERY_ROOT
+FILE_DELIVERY = "python"
+FILE_DELIVERY_ROOT = WRITABLE_DIR
+FILE_DELIVERY_URL = "/" + APP_PREFIX + "protected/"
+
+# Rows per page in the overview, by default and at most (?size=N)
+OVERVIEW_PAGE_SIZE = 50
+OVERVIEW_MAX_PAGE_SIZE = 500
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/1.9/howto/deployment/checklist/
 
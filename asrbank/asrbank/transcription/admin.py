@@ -16,6 +16,7 @@ import logging
 
 from asrbank.transcription.models import *
 from asrbank.transcription.forms import *
+from asrbank.transcription.search import search_filter
 from asrbank.settings import APP_PREFIX
 
 MAX_IDENTIFIER_LEN = 10
@@ -242,7 +243,8 @@ class DescriptorAdmin(admin.ModelAdmin):
     #       (This statement depends on the user-status: exclude = ['owner']  )
     #       (See get_form() for details                                      )
     list_display = ['identifier_column', 'id', 'owner', 'access', 'projectTitle', 'interviewDate']
-    search_fields = ['identifier', 'owner', 'projectTitle']
+    # The search box looks in the full-text index (see get_search_results())
+    search_fields = ['identifier', 'projectTitle']
     list_filter = ['access']
 
     inlines = [TopicInline, LanguageInline, FileFormatInline, AvailabilityInline,
@@ -276,6 +278,8 @@ class DescriptorAdmin(admin.ModelAdmin):
                 )
         # Continue with regular form-loading
         form = super(DescriptorAdmin, self).get_form(request, obj, **kwargs)
+        # A new descriptor will belong to this user (see save_model())
+        form.default_owner = request.user
         return form
 
     def save_model(self, request, obj, form, change):
@@ -291,6 +295,13 @@ class DescriptorAdmin(admin.ModelAdmin):
         qs = Descriptor.objects.filter(*lstQ).select_related()
         return qs
 
+    def get_search_results(self, request, queryset, search_term):
+        """Use the full-text index instead of LIKE scans over [search_fields]"""
+
+        if search_term.strip() == "":
+            return (queryset, False)
+        return (queryset.filter(search_filter(search_term)), False)
+
     def save_formset(self, request, form, formset, change):
         instances = formset.save(commit=False)
         for obj in formset.deleted_objects:
@@ -0,0 +1,22 @@
+"""
+Configuration of the transcription application.
+"""
+
+from django.apps import AppConfig
+
+
+class TranscriptionConfig(AppConfig):
+    name = 'asrbank.transcription'
+    # The migrations were made with integer keys
+    default_auto_field = 'django.db.models.AutoField'
+
+    def ready(self):
+        # The full-text index follows every change of the descriptors
+        from asrbank.transcription.search import connect_search_index
+        connect_search_index()
+        # Deleted descriptors are taken out of the registry
+        from asrbank.transcription.publish import connect_descriptor_deleted
+        connect_descriptor_deleted()
+        # Removed jobs take their archives along
+        from asrbank.transcription.jobs import connect_job_deleted
+        connect_job_deleted()
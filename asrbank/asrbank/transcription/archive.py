@@ -0,0 +1,84 @@
+"""
+Streaming archives of descriptor XML files.
+
+The archives are produced piece by piece while the descriptors are being
+serialized, so that nothing of the size of the whole archive is ever kept
+in memory or on disk.
+"""
+
+import io
+import tarfile
+import zipfile
+
+from asrbank.transcription.export import *
+
+
+class StreamBuffer(object):
+    """Write-only file object that hands out what was written to it in chunks
+
+    It has no seek(), so zipfile treats it as an unseekable stream and
+    writes a data descriptor after each entry instead of going back to
+    fill in the sizes.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+
+    def write(self, bData):
+        bData = bytes(bData)
+        self.chunks.append(bData)
+        self.pos += len(bData)
+        return len(bData)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def pop(self):
+        """Get everything written since the last call to pop()"""
+        bBack = b"".join(self.chunks)
+        self.chunks = []
+        return bBack
+
+
+def descriptor_entries(qs, request):
+    """Yield (file name, utf-8 XML) for each valid descriptor in [qs]"""
+
+    for (descr_this, bValid, sXmlText, lErrors) in generate_descriptor_xml(qs, request):
+        if bValid:
+            yield (descr_this.identifier + ".xml", sXmlText.encode("utf-8"))
+
+def stream_zip(entries):
+    """Yield the bytes of a deflated ZIP archive holding the (name, data) [entries]"""
+
+    buffer = StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for (sName, bData) in entries:
+            archive.writestr(sName, bData)
+            # Each entry is complete, including its data descriptor
+            yield buffer.pop()
+    # The central directory
+    yield buffer.pop()
+
+def stream_tar(entries):
+    """Yield the bytes of a gzipped tar archive holding the (name, data) [entries]
+
+    The tar is opened in stream mode ('w|gz'), so only the current entry and
+    the state of the compressor are ever held in memory.
+    """
+
+    buffer = StreamBuffer()
+    with tarfile.open(fileobj=buffer, mode="w|gz") as tar:
+        for (sName, bData) in entries:
+            info = tarfile.TarInfo(name=sName)
+            info.size = len(bData)
+            tar.addfile(tarinfo=info, fileobj=io.BytesIO(bData))
+            # Whatever the compressor has produced so far can go
+            bChunk = buffer.pop()
+            if bChunk:
+                yield bChunk
+    # The end-of-archive blocks and the gzip trailer
+    yield buffer.pop()
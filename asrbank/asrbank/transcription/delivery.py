@@ -0,0 +1,148 @@
+"""
+Delivery of files from disk.
+
+Files are sent with Content-Length, Last-Modified and an ETag, and a
+single HTTP byte range may be requested so that interrupted downloads
+can be resumed.
+
+Depending on FILE_DELIVERY the bytes are sent by Python or handed over to
+the front-end server with X-Sendfile or X-Accel-Redirect.
+"""
+
+from django.http import HttpResponse, HttpResponseNotModified, FileResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+import os
+import re
+from urllib.parse import quote
+
+from asrbank.settings import FILE_DELIVERY, FILE_DELIVERY_ROOT, FILE_DELIVERY_URL
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_etag(oStat):
+    """Get the ETag of a file from its os.stat() result [oStat]"""
+    return '"{:x}-{:x}"'.format(oStat.st_mtime_ns, oStat.st_size)
+
+def parse_range(sRange, iSize):
+    """Get the (first, last) byte positions of a 'bytes=...' [sRange] in a file of [iSize] bytes
+
+    Returns None when the header should be ignored and False when the range
+    can not be satisfied. Only a single range is supported.
+    """
+
+    m = re.match(r'^bytes=(\d*)-(\d*)$', sRange.strip())
+    if m == None or m.group(1) + m.group(2) == "":
+        return None
+    if m.group(1) == "":
+        # A suffix range: the last so many bytes
+        iLength = int(m.group(2))
+        if iLength == 0 or iSize == 0:
+            return False
+        return (max(iSize - iLength, 0), iSize - 1)
+    iFirst = int(m.group(1))
+    iLast = iSize - 1 if m.group(2) == "" else min(int(m.group(2)), iSize - 1)
+    if iFirst >= iSize or iLast < iFirst:
+        return False
+    return (iFirst, iLast)
+
+def read_range(fName, iFirst, iLength):
+    """Yield [iLength] bytes of file [fName] starting at [iFirst]"""
+
+    with open(fName, mode="rb") as f:
+        f.seek(iFirst)
+        while iLength > 0:
+            bChunk = f.read(min(CHUNK_SIZE, iLength))
+            if not bChunk:
+                break
+            iLength -= len(bChunk)
+            yield bChunk
+
+def is_not_modified(request, sEtag, fMtime):
+    """Does the client already have the version of the file with [sEtag] and [fMtime]?"""
+
+    sIfNoneMatch = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if sIfNoneMatch != "":
+        # Weak comparison: a compressed copy of the same content still matches
+        lEtags = [s.strip() for s in sIfNoneMatch.split(',')]
+        return sEtag in [s[2:] if s.startswith("W/") else s for s in lEtags] or "*" in lEtags
+    iSince = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return iSince != None and int(fMtime) <= iSince
+
+def sendfile_response(fName, sContentType):
+    """Get a response that lets the front-end server send [fName]
+
+    Returns None when Python has to send the file itself.
+    """
+
+    if FILE_DELIVERY == "x-sendfile":
+        response = HttpResponse(content_type=sContentType)
+        response['X-Sendfile'] = fName
+    elif FILE_DELIVERY == "x-accel-redirect":
+        sRoot = os.path.abspath(FILE_DELIVERY_ROOT)
+        if os.path.commonpath([sRoot, fName]) != sRoot:
+            return None
+        sPath = os.path.relpath(fName, sRoot).replace(os.sep, "/")
+        response = HttpResponse(content_type=sContentType)
+        response['X-Accel-Redirect'] = FILE_DELIVERY_URL.rstrip("/") + "/" + quote(sPath)
+    else:
+        return None
+    return response
+
+def python_response(request, fName, sContentType, iSize, sEtag):
+    """Send the whole file [fName], or the range that [request] asks for"""
+
+    tplRange = None
+    sRange = request.META.get('HTTP_RANGE', '')
+    sIfRange = request.META.get('HTTP_IF_RANGE', '')
+    # A range is only valid for the version of the file the client already has part of
+    if sRange != "" and (sIfRange == "" or sIfRange == sEtag):
+        tplRange = parse_range(sRange, iSize)
+    if tplRange == False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = 'bytes */{}'.format(iSize)
+    elif tplRange == None:
+        response = FileResponse(open(fName, mode="rb"), content_type=sContentType)
+        response['Content-Length'] = iSize
+    else:
+        (iFirst, iLast) = tplRange
+        iLength = iLast - iFirst + 1
+        response = StreamingHttpResponse(read_range(fName, iFirst, iLength), status=206, content_type=sContentType)
+        response['Content-Length'] = iLength
+        response['Content-Range'] = 'bytes {}-{}/{}'.format(iFirst, iLast, iSize)
+    return response
+
+def accepts_gzip(request):
+    return "gzip" in request.META.get('HTTP_ACCEPT_ENCODING', '')
+
+def file_response(request, fName, sContentType, sAttachment=None, sEncoding=None):
+    """Send file [fName], honouring If-None-Match, If-Modified-Since, Range and If-Range from [request]
+
+    When [sAttachment] is given, the file is offered for download under that name.
+    [sEncoding] is the Content-Encoding of the file (e.g. 'gzip' for a precompressed copy).
+    """
+
+    fName = os.path.abspath(fName)
+    oStat = os.stat(fName)
+    iSize = oStat.st_size
+    sEtag = get_etag(oStat)
+
+    if is_not_modified(request, sEtag, oStat.st_mtime):
+        response = HttpResponseNotModified()
+    else:
+        # The front-end server may take care of the body, including ranges
+        # (nginx drops the Content-Encoding of an X-Accel-Redirect response)
+        response = None
+        if sEncoding == None or FILE_DELIVERY == "x-sendfile":
+            response = sendfile_response(fName, sContentType)
+        if response == None:
+            response = python_response(request, fName, sContentType, iSize, sEtag)
+        if sAttachment != None and response.status_code != 416:
+            response['Content-Disposition'] = 'attachment; filename="{}"'.format(sAttachment)
+
+    if sEncoding != None and response.status_code != 416:
+        response['Content-Encoding'] = sEncoding
+    response['ETag'] = sEtag
+    response['Last-Modified'] = http_date(oStat.st_mtime)
+    response['Accept-Ranges'] = 'bytes'
+    return response
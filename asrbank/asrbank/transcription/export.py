@@ -0,0 +1,647 @@
+"""
+CMDI export of descriptors.
+
+A descriptor is built directly as an lxml tree, validated in memory against
+the OralHistoryInterview XSD and serialized exactly once.
+
+Bulk exports (see generate_descriptor_xml) read the database in the parent
+process and leave validation and serialization to a pool of EXPORT_JOBS
+worker processes, which is started once per process (see get_export_pool).
+"""
+
+from django.urls import reverse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import atexit
+import django
+import lxml
+from lxml import etree
+import os
+import threading
+
+from asrbank.settings import WRITABLE_DIR, XSD_NAME, EXPORT_JOBS
+from asrbank.transcription.models import *
+from asrbank.transcription.reference import country_by_name, language_code
+
+# Local variables
+XSI_CMD = "http://www.clarin.eu/cmd/"
+XSD_ID = "clarin.eu:cr1:p_1487686159240"
+XSI_XSD = "https://catalog.clarin.eu/ds/ComponentRegistry/rest/registry/1.1/profiles/" + XSD_ID + "/xsd/"
+# Namespaces declared on the <CMD> element (in this order)
+CMD_NSMAP = {None: XSI_CMD,
+             'xsd': "http://www.w3.org/2001/XMLSchema/",
+             'xsi': "http://www.w3.org/2001/XMLSchema-instance/"}
+XML_DECLARATION = '<?xml version="1.0" ?>'
+
+# Compiled XSD schemas per thread, per file name: (mtime, schema). A schema
+# keeps the error log of its last validation, so threads do not share one.
+schema_cache = threading.local()
+# The worker pools of this process, per number of workers
+export_pools = {}
+export_pool_lock = threading.Lock()
+
+# The reverse relations that add_descriptor_xml() follows
+DESCRIPTOR_RELATIONS = ['fileformats', 'availabilities', 'genres', 'anonymisations', 'topics', 'languages',
+                        'interviewees', 'interviewers', 'temporalcoverages', 'spatialcoverages', 'annotations']
+# Number of descriptors read from the database at once in a bulk export
+EXPORT_CHUNK_SIZE = 500
+# Number of descriptors per worker that may wait for their XML in a bulk export
+EXPORT_WINDOW = 4
+
+
+def cmd_element(parent, el_name, attrib=None):
+    """Add element [el_name] in the CMD namespace under [parent]"""
+    if attrib == None: attrib = {}
+    return etree.SubElement(parent, "{" + XSI_CMD + "}" + el_name, attrib)
+
+def add_element(optionality, item_this, el_name, crp, **kwargs):
+    """Add element [el_name] from descriptor [item_this] under the XML element [crp]
+
+    Note: make use of the options defined in [kwargs]
+    """
+
+    foreign = ""
+    if "foreign" in kwargs: foreign = kwargs["foreign"]
+    field_choice = ""
+    if "fieldchoice" in kwargs: field_choice = kwargs["fieldchoice"]
+    field_name = el_name
+    if "field_name" in kwargs: field_name = kwargs["field_name"]
+    item_this_el = getattr(item_this, field_name)
+    sub_name = el_name
+    if "subname" in kwargs: sub_name = kwargs["subname"]
+    if optionality == "0-1" or optionality == "1":
+        item_value = item_this_el
+        if optionality == "1" or (item_value != None and item_value != "(empty)"):
+            if foreign != "" and not isinstance(item_this_el, str):
+                item_value = getattr(item_this_el, foreign)
+            if field_choice != "": item_value = choice_english(field_choice, item_value)
+            # Make sure the value is a string
+            item_value = str(item_value)
+            # Do we need to discern parts?
+            if "part" in kwargs:
+                arPart = item_value.split(":")
+                iPart = kwargs["part"]
+                if iPart == 1:
+                    item_value = arPart[0]
+                elif iPart == 2:
+                    if len(arPart) == 2:
+                        item_value = arPart[1]
+                    else:
+                        item_value = ""
+            if item_value != "" and item_value != "(empty)":
+                descr_element = cmd_element(crp, sub_name)
+                descr_element.text = item_value
+    elif optionality == "1-n" or optionality == "0-n":
+        # Test for obligatory foreign
+        if foreign == "": return False
+        for t in item_this_el.all():
+            item_value = getattr(t, foreign)
+            if field_choice != "": item_value = choice_english(field_choice, item_value)
+            # Make sure the value is a string
+            item_value = str(item_value)
+            if item_value == "(empty)":
+                item_value = "unknown"
+            else:
+                title_element = cmd_element(crp, sub_name)
+                title_element.text = item_value
+    # Return positively
+    return True
+
+def make_descriptor_top(request):
+    """Create the top-level elements for a descriptor"""
+
+    # Define the top-level of the xml output
+    top = etree.Element("{" + XSI_CMD + "}CMD", nsmap=CMD_NSMAP)
+    top.set("{" + CMD_NSMAP['xsi'] + "}schemaLocation", XSI_CMD + " " + XSI_XSD)
+    top.set("CMDVersion", "1.1")
+
+    # Add a header
+    hdr = cmd_element(top, "Header")
+    mdSelf = cmd_element(hdr, "MdSelfLink")
+    mdProf = cmd_element(hdr, "MdProfile")
+    mdProf.text = XSD_ID
+    # Add obligatory Resources
+    rsc = cmd_element(top, "Resources")
+    lproxy = cmd_element(rsc, "ResourceProxyList")
+    # TODO: add resource proxy's under [lproxy]
+
+    # Produce a link to the resource
+    oProxy = cmd_element(lproxy, "ResourceProxy")
+    sProxyId = "oh_000000000001"
+    oProxy.set('id', sProxyId)
+    # Add resource type
+    oSubItem = cmd_element(oProxy, "ResourceType")
+    oSubItem.set("mimetype", "application/sru+xml")
+    oSubItem.text = "SearchService"
+    # Add resource ref
+    oSubItem = cmd_element(oProxy, "ResourceRef")
+    oSubItem.text = get_resource_ref(request)
+
+
+    cmd_element(rsc, "JournalFileProxyList")
+    cmd_element(rsc, "ResourceRelationList")
+    # Return the resulting top-level element
+    return top
+
+def add_descriptor_xml(item_this, main):
+    """Add the DESCRIPTOR information from [item_this] to XML element [main]"""
+
+    # [1] Project title
+    add_element("1", item_this, "ProjectTitle", main, field_name="projectTitle")
+    # [1] ID of the interview
+    add_element("1", item_this, "InterviewId", main, field_name="interviewId")
+    # [0-1] Date of the interview
+    add_element("0-1", item_this, "InterviewDate", main, field_name="interviewDate")
+    # [0-1] Length of the interview
+    add_element("0-1", item_this, "InterviewLength", main, field_name="interviewLength")
+    # [0-n] FileFormat
+    add_element("0-n", item_this, "FileFormat", main,
+                field_name="fileformats", foreign="name", fieldchoice=AUDIOVIDEO_FORMAT)
+    # [0-n] Availability
+    add_element("0-n", item_this, "Availability", main,
+                field_name="availabilities", foreign="name", fieldchoice=AVAILABILITY)
+    # ============ REMOVED ===============
+    # # [0-1] Copyright description
+    # add_element("0-1", item_this, "Copyright", main, field_name="copyright")
+    # ------------------------------------
+    # [1-n] Genre
+    add_element("1-n", item_this, "Genre", main,
+                field_name="genres", foreign="name", fieldchoice=INTERVIEW_GENRE)
+    # [1] Project title
+    add_element("1", item_this, "Modality", main, field_name="modality", fieldchoice=INTERVIEW_MODALITY)
+    # [0-n] Anonymisation level
+    add_element("0-n", item_this, "Anonymisation", main,
+                field_name="anonymisations", foreign="name", fieldchoice=ANONYMISATION)
+    # ==============================================================================
+    # [0-1] Topic list
+    # Note: when the topics are prefetched, neither line below needs a query
+    if len(item_this.topics.all()) > 0:
+        topList = cmd_element(main, "TopicList")
+        add_element("0-n", item_this, "Topic", topList,
+                    field_name="topics", foreign="name")
+    # [1-n] Language of the transcription
+    for lng_this in item_this.languages.all():
+        (sLngName, sLngCode) = get_language(lng_this.name)
+        # Validation
+        if sLngCode == "" or sLngCode == None:
+            bStop = True
+        else:
+            lngMain = cmd_element(main, "Language")
+            lngMainName = cmd_element(lngMain, "LanguageName")
+            lngMainName.text = sLngName
+            lngMainCode = cmd_element(lngMain, "ISO639")
+            lngMainCodeVal = cmd_element(lngMainCode, "iso-639-3-code")
+            lngMainCodeVal.text = sLngCode
+    # [1-n] Interviewee
+    for wee_this in item_this.interviewees.all():
+        # Start adding the sub-element
+        wee_sub = cmd_element(main, "Interviewee")
+        # [1] code
+        add_element("1", wee_this, "Code", wee_sub, field_name="code")
+        # [0-1] Name of the interviewee
+        add_element("0-1", wee_this, "Name", wee_sub, field_name="name")
+        # [0-1] Gender of the interviewee
+        add_element("0-1", wee_this, "Gender", wee_sub, field_name="gender", fieldchoice=PARTICIPANT_GENDER)
+        # [0-1] Age of the interviewee
+        add_element("0-1", wee_this, "Age", wee_sub, field_name="age")
+    # [1-n] Interviewer
+    for wer_this in item_this.interviewers.all():
+        # Start adding the sub-element
+        wer_sub = cmd_element(main, "Interviewer")
+        # [1] code
+        add_element("1", wer_this, "Code", wer_sub, field_name="code")
+        # [0-1] Name of the interviewer
+        add_element("0-1", wer_this, "Name", wer_sub, field_name="name")
+        # [0-1] Gender of the interviewer
+        add_element("0-1", wer_this, "Gender", wer_sub, field_name="gender", fieldchoice=PARTICIPANT_GENDER)
+        # [0-1] Age of the interviewer
+        add_element("0-1", wer_this, "Age", wer_sub, field_name="age")
+    # [0-n] Temporal coverage
+    for cov_this in item_this.temporalcoverages.all():
+        # Start adding the sub-element
+        cov_sub = cmd_element(main, "TemporalCoverage")
+        # [1] start year
+        add_element("1", cov_this, "startYear", cov_sub, field_name="startYear")
+        # [1] end year
+        add_element("1", cov_this, "endYear", cov_sub, field_name="endYear")
+    # [0-n] Spatial coverage
+    for cov_this in item_this.spatialcoverages.all():
+        # Start adding the sub-element
+        cov_sub = cmd_element(main, "SpatialCoverage")
+        # [0-1] place (=city)
+        add_element("0-1", cov_this, "Place", cov_sub, field_name="place")
+        # country (0-1)
+        cntry = cov_this.country
+        if cntry != None:
+            # Look up the country in the list
+            (sEnglish, sAlpha2) = get_country(cntry)
+            # Set the values
+            cntMain = cmd_element(cov_sub, "Country")
+            cntMainName = cmd_element(cntMain, "CountryName")
+            cntMainCoding = cmd_element(cntMain, "CountryCoding")
+            cntMainName.text = sEnglish
+            cntMainCoding.text = sAlpha2
+    # annotation (0-n)
+    for ann_this in item_this.annotations.all():
+        # Add this annotation element
+        ann = cmd_element(main, "Annotation")
+        # [1]   type
+        add_element("1", ann_this, "AnnotationType", ann, fieldchoice=ANNOTATION_TYPE, field_name="type")
+        # [0-1] mode
+        add_element("0-1", ann_this, "AnnotationMode", ann, fieldchoice=ANNOTATION_MODE, field_name="mode")
+        # [0-1] format
+        add_element("0-1", ann_this, "AnnotationFormat", ann, fieldchoice=ANNOTATION_FORMAT, field_name="format")
+
+def descriptors_for_export(qs, iChunk=EXPORT_CHUNK_SIZE):
+    """Iterate over the descriptors in [qs] with all their child rows prefetched
+
+    Descriptors are read in chunks of [iChunk]. Each chunk costs one query for the
+    descriptors and one for each of the DESCRIPTOR_RELATIONS, no matter its size.
+    """
+
+    qs = qs.select_related('xmlcache', 'owner').prefetch_related(*DESCRIPTOR_RELATIONS)
+    return qs.iterator(chunk_size=iChunk)
+
+def get_descriptor_xml(descriptor_this, request):
+    """Get the validated XML of a descriptor, from DescriptorXml if possible
+
+    The cached XML is used as long as the descriptor and its child rows are unchanged
+    (see descriptor_changed), it was built for the same ResourceRef URL
+    and it was validated against the current XSD file.
+    Note: the returns a TUPLE of a boolean and a string
+    """
+
+    sRef = get_resource_ref(request)
+    iMtime = get_schema_mtime()
+    iVocabulary = vocabulary.get_version()
+    sXmlText = get_cached_xml(descriptor_this, sRef, iMtime, iVocabulary)
+    if sXmlText != None:
+        return (True, sXmlText)
+
+    # Create the XML afresh and keep it if it is valid
+    (bValid, sXmlText) = create_descriptor_xml(descriptor_this, request)
+    if bValid:
+        store_descriptor_xml(descriptor_this, sRef, iMtime, iVocabulary, sXmlText)
+    return (bValid, sXmlText)
+
+def get_cached_xml(descriptor_this, sRef, iMtime, iVocabulary):
+    """Get the cached XML of a descriptor if it is still valid for [sRef], [iMtime] and vocabulary version [iVocabulary], or None"""
+
+    try:
+        oCache = descriptor_this.xmlcache
+    except DescriptorXml.DoesNotExist:
+        return None
+    if oCache != None and oCache.resource_ref == sRef and oCache.xsd_mtime == iMtime and oCache.vocabulary == iVocabulary:
+        return oCache.xml
+    return None
+
+def store_descriptor_xml(descriptor_this, sRef, iMtime, iVocabulary, sXmlText):
+    """Keep [sXmlText], which was built with the labels of vocabulary version [iVocabulary]
+
+    XML built by a process whose labels were out of date is stored under the
+    old version, so it is never used (see get_cached_xml()).
+    """
+    DescriptorXml.objects.update_or_create(
+        descriptor=descriptor_this,
+        defaults={'resource_ref': sRef, 'xsd_mtime': iMtime, 'vocabulary': iVocabulary, 'xml': sXmlText})
+
+def get_export_pool(iJobs=None):
+    """Get the pool of [iJobs] (default: EXPORT_JOBS) worker processes for generate_descriptor_xml(), or None for one job
+
+    The pool is started the first time it is needed and then used by every
+    export of this process, until the process exits.
+    """
+
+    if iJobs == None:
+        iJobs = EXPORT_JOBS
+    if iJobs <= 1:
+        return None
+    with export_pool_lock:
+        executor = export_pools.get(iJobs)
+        if executor == None:
+            # The workers set up Django themselves when they are not forked
+            executor = ProcessPoolExecutor(max_workers=iJobs, initializer=django.setup)
+            export_pools[iJobs] = executor
+    return executor
+
+def shutdown_export_pools():
+    with export_pool_lock:
+        for executor in export_pools.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        export_pools.clear()
+
+atexit.register(shutdown_export_pools)
+
+def generate_descriptor_xml(qs, request, iJobs=None, executor=None):
+    """Yield (descriptor, valid, XML or error HTML, errors) for each descriptor in [qs], in the order of [qs]
+
+    The descriptors are read in batches and their trees are built in this process.
+    Validation and serialization are spread over [iJobs] worker processes
+    (default: EXPORT_JOBS); with one job everything happens in this process.
+    The workers are those of get_export_pool(), unless another pool is passed
+    as [executor].
+    Valid XML is kept in DescriptorXml, just like get_descriptor_xml() does.
+    The errors are the dictionaries made by xsd_error_dicts(), or [] for valid XML.
+    """
+
+    if iJobs == None:
+        iJobs = EXPORT_JOBS
+    sRef = get_resource_ref(request)
+    iMtime = get_schema_mtime()
+    iVocabulary = vocabulary.get_version()
+    if iJobs <= 1 and executor == None:
+        for descr_this in descriptors_for_export(qs):
+            sXmlText = get_cached_xml(descr_this, sRef, iMtime, iVocabulary)
+            if sXmlText != None:
+                yield (descr_this, True, sXmlText, [])
+                continue
+            (bValid, sXmlText, lErrors) = check_descriptor_xml(build_descriptor_tree(descr_this, request))
+            if bValid:
+                store_descriptor_xml(descr_this, sRef, iMtime, iVocabulary, sXmlText)
+            yield (descr_this, bValid, sXmlText, lErrors)
+        return
+
+    def collect(tplPending):
+        (descr_this, oFuture, sXmlText) = tplPending
+        if oFuture == None:
+            return (descr_this, True, sXmlText, [])
+        (bValid, sXmlText, lErrors) = oFuture.result()
+        if bValid:
+            store_descriptor_xml(descr_this, sRef, iMtime, iVocabulary, sXmlText)
+        return (descr_this, bValid, sXmlText, lErrors)
+
+    if executor == None:
+        executor = get_export_pool(iJobs)
+    lPending = deque()
+    try:
+        for descr_this in descriptors_for_export(qs):
+            sXmlText = get_cached_xml(descr_this, sRef, iMtime, iVocabulary)
+            if sXmlText != None:
+                lPending.append((descr_this, None, sXmlText))
+            else:
+                bTree = etree.tostring(build_descriptor_tree(descr_this, request))
+                lPending.append((descr_this, executor.submit(finish_descriptor_bytes, bTree), None))
+            # Hand out what is ready, and wait when too much is in flight
+            while len(lPending) > 0 and (len(lPending) > iJobs * EXPORT_WINDOW or
+                                         lPending[0][1] == None or lPending[0][1].done()):
+                yield collect(lPending.popleft())
+        while len(lPending) > 0:
+            yield collect(lPending.popleft())
+    finally:
+        # Leave the pool free for the next call
+        for tplPending in lPending:
+            if tplPending[1] != None:
+                tplPending[1].cancel()
+
+class ExportRequest(object):
+    """Stand-in for the HttpRequest that the export needs, outside the web tier
+
+    Only build_absolute_uri() is used. [sBaseUrl] holds the scheme and host,
+    e.g. "http://applejack.science.ru.nl".
+    """
+
+    def __init__(self, sBaseUrl):
+        self.base_url = sBaseUrl.rstrip("/")
+
+    def build_absolute_uri(self, location):
+        return self.base_url + location
+
+def get_resource_ref(request):
+    """The URL that goes into the <ResourceRef> of every descriptor"""
+    #  "http://applejack.science.ru.nl/oh-metadataregistry"
+    return request.build_absolute_uri(reverse('home'))
+
+def build_descriptor_tree(descriptor_this, request):
+    """Build the complete <CMD> tree of the 'descriptor' object"""
+
+    # Create a top-level element, including CMD, Header and Resources
+    top = make_descriptor_top(request)
+
+    # Start components and this collection component
+    cmp = cmd_element(top, "Components")
+
+    # Add a <OralHistoryInterview> root that contains a list of <collection> objects
+    descrroot = cmd_element(cmp, "OralHistoryInterview")
+
+    # Add this collection to the xml
+    add_descriptor_xml(descriptor_this, descrroot)
+    return top
+
+def create_descriptor_xml(descriptor_this, request, pretty=True):
+    """Convert the 'descriptor' object from the context to XML
+
+    Note: the returns a TUPLE of a boolean and a string
+    """
+
+    return finish_descriptor_xml(build_descriptor_tree(descriptor_this, request), pretty)
+
+def finish_descriptor_bytes(bTree, pretty=True):
+    """Validate and serialize the compact XML [bTree] of a descriptor (runs in a worker)"""
+    return check_descriptor_xml(etree.fromstring(bTree), pretty)
+
+def finish_descriptor_xml(top, pretty=True):
+    """Validate and serialize the tree [top]
+
+    Note: the returns a TUPLE of a boolean and a string
+    """
+
+    (bValid, sText, lErrors) = check_descriptor_xml(top, pretty)
+    return (bValid, sText)
+
+def check_descriptor_xml(top, pretty=True):
+    """Validate and serialize the tree [top]
+
+    Returns (True, XML, []) or (False, error HTML, error dictionaries)
+    """
+
+    # Validate the tree against the XSD
+    (bValid, oError) = validateXml(top)
+
+    # Convert the XML to a string
+    xmlstr = xml_to_string(top, pretty)
+
+    if not bValid:
+        # Validate the string, so that the errors point to its lines
+        (bValid, oError) = validateXml(xmlstr)
+        # Get error messages for all the errors
+        lErrors = xsd_error_dicts(oError)
+        return (False, xsd_error_list(lErrors, xmlstr), lErrors)
+
+    # Return this string
+    return (True, xmlstr, [])
+
+def xml_to_string(top, pretty=True):
+    """Serialize the tree [top] in one pass
+
+    The pretty layout is the one minidom's toprettyxml(indent="  ") produces.
+    """
+
+    if not pretty:
+        return XML_DECLARATION + etree.tostring(top, encoding="unicode")
+    lOutput = [XML_DECLARATION, "\n"]
+    write_pretty(top, None, "", lOutput)
+    return "".join(lOutput)
+
+def write_pretty(el, parent, sIndent, lOutput):
+    """Add the pretty-printed element [el] to the list of strings [lOutput]"""
+
+    sName = get_prefixed_name(el, el.tag)
+    lOutput.append(sIndent + "<" + sName)
+    # Namespace declarations come first, then the attributes
+    for sPrefix, sUri in el.nsmap.items():
+        if parent == None or parent.nsmap.get(sPrefix) != sUri:
+            sAttr = "xmlns" if sPrefix == None else "xmlns:" + sPrefix
+            lOutput.append(' ' + sAttr + '="' + escape_data(sUri) + '"')
+    for sAttr, sValue in el.attrib.items():
+        lOutput.append(' ' + get_prefixed_name(el, sAttr) + '="' + escape_data(sValue) + '"')
+    if len(el) > 0:
+        lOutput.append(">\n")
+        for child in el:
+            write_pretty(child, el, sIndent + "  ", lOutput)
+        lOutput.append(sIndent + "</" + sName + ">\n")
+    elif el.text:
+        lOutput.append(">" + escape_data(el.text) + "</" + sName + ">\n")
+    else:
+        lOutput.append("/>\n")
+
+def get_prefixed_name(el, sName):
+    """Turn '{uri}name' into 'prefix:name' using the namespaces of [el]"""
+
+    if sName[:1] != "{":
+        return sName
+    (sUri, sLocal) = sName[1:].split("}", 1)
+    for sPrefix, sNsUri in el.nsmap.items():
+        if sNsUri == sUri:
+            return sLocal if sPrefix == None else sPrefix + ":" + sLocal
+    return sLocal
+
+def escape_data(sData):
+    """Escape text and attribute values the way minidom does"""
+    return sData.replace("&", "&amp;").replace("<", "&lt;").replace("\"", "&quot;").replace(">", "&gt;")
+
+def get_country(cntryCode):
+    # Get the country string according to field-choice
+    sCountry = choice_english(COVERAGE_SPATIAL_COUNTRY, cntryCode).strip()
+    # Look up the country name or alternative "(the)" country name
+    tplCountry = country_by_name(sCountry)
+    if tplCountry != None:
+        # REturn the correct country name and code
+        return (tplCountry[1], tplCountry[0])
+    # Empty
+    return (None, None)
+
+def get_language(lngCode):
+    # Get the language string according to the field choice
+    sLanguage = choice_english(INTERVIEW_LANGUAGE, lngCode).lower()
+    # Look up the language name (must be complete match)
+    sCode = language_code(sLanguage)
+    if sCode != None:
+        return (sLanguage, sCode)
+    # Empty
+    return (None, None)
+
+def validateXml(xml):
+    """Validate XML against an XSD schema
+
+    The first argument is either an lxml element or a string containing the XML.
+    The XSD schema that is being used must be present in the static files section.
+    Raises a RuntimeError when the schema cannot be compiled (see get_compiled_schema()).
+    """
+
+    # Get the XSD definition
+    schema = getSchema()
+
+    # Load the XML string into a document
+    if isinstance(xml, str):
+        xml = etree.XML(xml)
+
+    # Perform the validation: the schema belongs to this thread, and so does its error log
+    validation = schema.validate(xml)
+    error_log = schema.error_log
+    # Return a tuple with the boolean validation and a possible error log
+    return (validation, error_log, )
+
+def getSchemaFile():
+    return os.path.abspath(os.path.join(WRITABLE_DIR, "xsd", XSD_NAME))
+
+def getSchema():
+    # Get the XSD file into an LXML structure
+    return get_compiled_schema(getSchemaFile())
+
+def get_schema_mtime():
+    """Get the modification time (in ns) of the XSD file, or 0 if it is missing"""
+    try:
+        return os.stat(getSchemaFile()).st_mtime_ns
+    except OSError:
+        return 0
+
+def get_compiled_schema(fSchema):
+    """Get the compiled XMLSchema for file [fSchema]
+
+    Raises a RuntimeError with the message of lxml when the schema does not compile.
+    Compiling is expensive, so the result is kept per thread: no thread
+    waits for another one to validate.
+    The schema is compiled again when the modification time of the file changes.
+    """
+
+    iMtime = os.stat(fSchema).st_mtime_ns
+    if not hasattr(schema_cache, 'schemas'):
+        schema_cache.schemas = {}
+    oCached = schema_cache.schemas.get(fSchema)
+    if oCached != None and oCached[0] == iMtime:
+        return oCached[1]
+    with open(fSchema, encoding="utf-8", mode="r") as f:
+        sText = f.read()
+        doc = etree.XML(sText)
+
+    # Load the schema: without it no XML can be checked
+    try:
+        schema = etree.XMLSchema(doc)
+    except lxml.etree.XMLSchemaParseError as e:
+        raise RuntimeError("The XSD schema {} could not be compiled: {}".format(fSchema, e)) from e
+    schema_cache.schemas[fSchema] = (iMtime, schema)
+    return schema
+
+def xsd_error_dicts(lError):
+    """Transform a list of XSD error objects into a list of dictionaries"""
+
+    return [{'line': oError.line, 'column': oError.column, 'level': oError.level_name,
+             'domain': oError.domain_name, 'type': oError.type_name, 'message': oError.message,
+             'text': xsd_error_as_simple_string(oError)} for oError in lError]
+
+def xsd_error_list(lError, sXmlStr):
+    """Transform a list of XSD error dictionaries (see xsd_error_dicts) into an HTML report"""
+
+    lHtml = []
+    lHtml.append("<html><body><h3>XML output errors</h3><table>")
+    lHtml.append("<thead><th>line</th><th>column</th><th>level</th><th>domain</th><th>type</th><th>message</th></thead>")
+    lHtml.append("<tbody>")
+    for oError in lError:
+        lHtml.append("<tr><td>" + str(oError['line']) + "</td>" +
+                     "<td>" +str(oError['column']) + "</td>" +
+                     "<td>" +oError['level'] + "</td>" +
+                     "<td>" +oError['domain'] + "</td>" +
+                     "<td>" +oError['type'] + "</td>" +
+                     "<td>" +oError['message'] + "</td>")
+    lHtml.append("</tbody></table>")
+    # Add the XML string
+    lHtml.append("<h3>The XML file contents:</h3>")
+    lHtml.append("<div class='rawxml'><pre class='brush: xml;'>" + sXmlStr.replace("<", "&lt;").replace(">", "&gt;") + "</pre></div>")
+    # Finish the HTML feedback
+    lHtml.append("</body></html>")
+    return "\n".join(lHtml)
+
+def xsd_error_as_simple_string(error):
+    """
+    Returns a string based on an XSD error object with the format
+    LINE:COLUMN:LEVEL_NAME:DOMAIN_NAME:TYPE_NAME:MESSAGE.
+    """
+    parts = [
+        error.line,
+        error.column,
+        error.level_name,
+        error.domain_name,
+        error.type_name,
+        error.message
+    ]
+    return ':'.join([str(item) for item in parts])
@@ -0,0 +1,163 @@
+"""
+Facets of the overview: narrowing down by genre, language, country,
+modality, access and annotation type.
+
+The counts of each facet come from one grouped query on the table holding
+the value. They are kept in an in-process cache for as long as the data
+version (the latest modification, the number of descriptors and the
+vocabulary version) stays the same; any change to a descriptor or one of
+its child rows touches Descriptor.modified. The counts follow the search
+and the year range of the overview, and are cached per filter. Labels
+come from the vocabulary cache.
+"""
+
+from django.db.models import Q, Count, Max
+import threading
+
+from asrbank.transcription.models import *
+
+# (URL parameter, title, FieldChoice field, model holding the value, field of that model)
+FACETS = [
+    ('genre', "Genre", INTERVIEW_GENRE, Genre, 'name'),
+    ('language', "Language", INTERVIEW_LANGUAGE, Language, 'name'),
+    ('country', "Country", COVERAGE_SPATIAL_COUNTRY, SpatialCoverage, 'country'),
+    ('modality', "Modality", INTERVIEW_MODALITY, Descriptor, 'modality'),
+    ('access', "Access", DESCRIPTOR_ACCESS, Descriptor, 'access'),
+    ('annotation', "Annotation type", ANNOTATION_TYPE, Annotation, 'type'),
+    ]
+# The cache is emptied when it holds this many selections
+FACET_CACHE_SIZE = 256
+
+
+def descriptor_column(model):
+    """The column of [model] that holds the descriptor id"""
+    return 'id' if model == Descriptor else 'descriptor_id'
+
+def get_facet_selection(query):
+    """Get the chosen values per facet from the QueryDict [query], as a sorted tuple of (parameter, values)"""
+
+    lBack = []
+    for (sKey, sTitle, sField, model, sValueField) in FACETS:
+        lValues = sorted(set([sValue for sValue in query.getlist(sKey) if sValue != ""]))
+        if len(lValues) > 0:
+            lBack.append((sKey, tuple(lValues)))
+    return tuple(lBack)
+
+def facet_filter(tplSelection):
+    """The Q objects selecting the descriptors that have one of the chosen values of every facet in [tplSelection]"""
+
+    oFacets = {tplFacet[0]: tplFacet for tplFacet in FACETS}
+    lstQ = []
+    for (sKey, tplValues) in tplSelection:
+        (sKey, sTitle, sField, model, sValueField) = oFacets[sKey]
+        if model == Descriptor:
+            lstQ.append(Q(**{sValueField + '__in': tplValues}))
+        else:
+            # A subquery on the child table, so that the rows of the overview are not multiplied
+            lstQ.append(Q(id__in=model.objects.filter(**{sValueField + '__in': tplValues}).values('descriptor_id')))
+    return lstQ
+
+def get_data_version():
+    """Something that changes whenever a descriptor or one of its child rows is added, changed or deleted
+
+    The vocabulary version is part of it, since a change in which fields
+    are searchable changes what a search finds.
+    """
+
+    oAggr = Descriptor.objects.aggregate(latest=Max('modified'), number=Count('id'))
+    return (oAggr['latest'], oAggr['number'], vocabulary.get_version())
+
+def count_facets(lstQ, tplSelection):
+    """Count the descriptors per value of each facet
+
+    The descriptors counted for a facet match [lstQ] and the choices in
+    [tplSelection] of the other facets: choosing a value of a facet adds to
+    what the facet already selects, so its own choices are left out.
+    Returns a dictionary: parameter -> {value: count}.
+    """
+
+    oBack = {}
+    for (sKey, sTitle, sField, model, sValueField) in FACETS:
+        tplOther = tuple([tplChoice for tplChoice in tplSelection if tplChoice[0] != sKey])
+        qs = Descriptor.objects.filter(*(lstQ + facet_filter(tplOther)))
+        if model == Descriptor:
+            qsValues = qs
+        else:
+            qsValues = model.objects.filter(descriptor_id__in=qs.values('id'))
+        oCounts = {}
+        for oRow in qsValues.order_by().values(sValueField).annotate(number=Count(descriptor_column(model), distinct=True)):
+            oCounts[oRow[sValueField]] = oRow['number']
+        oBack[sKey] = oCounts
+    return oBack
+
+
+class FacetCache(object):
+    """In-process facet counts per selection, for the current data version"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.counts = {}
+
+    def get(self, oKey, lstQ, tplSelection):
+        """Get the facet counts for [lstQ] and [tplSelection] (see count_facets()), which [oKey] identifies"""
+
+        oVersion = get_data_version()
+        with self.lock:
+            if oVersion != self.version or len(self.counts) >= FACET_CACHE_SIZE:
+                self.counts = {}
+                self.version = oVersion
+            oCounts = self.counts.get(oKey)
+        if oCounts == None:
+            oCounts = count_facets(lstQ, tplSelection)
+            with self.lock:
+                if self.version == oVersion:
+                    self.counts[oKey] = oCounts
+        return oCounts
+
+facet_cache = FacetCache()
+
+
+def get_facets(oUser, tplSelection, query, lstFilterQ=None, oFilterKey=()):
+    """Get the facets of the overview of [oUser] with the choices in [tplSelection]
+
+    The counts are restricted by the other filters of the overview [lstFilterQ]
+    (search, year range), which the hashable [oFilterKey] identifies in the cache.
+    Each facet is a dictionary with its 'key' (URL parameter), 'title' and
+    'values': a list of {'value', 'label', 'count', 'selected', 'query'} in
+    vocabulary order, where 'query' is the URL query that toggles the value.
+    """
+
+    lstQ = []
+    if not oUser.is_superuser:
+        lstQ.append(Q(owner=oUser))
+    if lstFilterQ != None:
+        lstQ.extend(lstFilterQ)
+    oKey = (None if oUser.is_superuser else oUser.id, oFilterKey, tplSelection)
+    oCounts = facet_cache.get(oKey, lstQ, tplSelection)
+
+    oSelected = dict(tplSelection)
+    lBack = []
+    for (sKey, sTitle, sField, model, sValueField) in FACETS:
+        oFacet = oCounts[sKey]
+        tplChosen = oSelected.get(sKey, ())
+        # Vocabulary order first, then whatever is not in the vocabulary
+        lValues = [str(iValue) for (iValue, sLabel) in vocabulary.choices(sField)]
+        lValues.extend(sorted([sValue for sValue in oFacet if not sValue in lValues]))
+        lFacetValues = []
+        for sValue in lValues:
+            if oFacet.get(sValue, 0) == 0 and not sValue in tplChosen:
+                continue
+            sLabel = vocabulary.english(sField, sValue)
+            # Clicking a value adds it to, or removes it from, the selection
+            toggled = query.copy()
+            lChosen = [s for s in tplChosen if s != sValue] if sValue in tplChosen else list(tplChosen) + [sValue]
+            toggled.setlist(sKey, lChosen)
+            for sPage in ('after', 'before'):
+                toggled.pop(sPage, None)
+            lFacetValues.append({'value': sValue, 'label': sValue if sLabel == None else sLabel,
+                                 'count': oFacet.get(sValue, 0), 'selected': sValue in tplChosen,
+                                 'query': toggled.urlencode()})
+        if len(lFacetValues) > 0:
+            lBack.append({'key': sKey, 'title': sTitle, 'values': lFacetValues})
+    return lBack
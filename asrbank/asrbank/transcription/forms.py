@@ -269,5 +269,20 @@ class DescriptorAdminForm(forms.ModelForm):
         self.fields['modality'].initial = choice_value(INTERVIEW_MODALITY, "spoken")
         self.fields['access'].initial = choice_value(DESCRIPTOR_ACCESS, "just me")
 
+    # The owner of a new descriptor when 'owner' is not on the form (set by DescriptorAdmin.get_form())
+    default_owner = None
+
+    def clean(self):
+        cleaned_data = super(DescriptorAdminForm, self).clean()
+        # Without 'owner' on the form, Django leaves the (owner, identifier) constraint unchecked
+        if not 'owner' in self.fields:
+            oOwner = self.instance.owner if self.instance.owner_id != None else self.default_owner
+            sIdentifier = cleaned_data.get('identifier')
+            if oOwner != None and sIdentifier != None:
+                qs = Descriptor.objects.filter(owner=oOwner, identifier=sIdentifier).exclude(id=self.instance.id)
+                if qs.exists():
+                    self.add_error('identifier', "You already have a metadata record with this identifier")
+        return cleaned_data
+
 
 
@@ -0,0 +1,194 @@
+"""
+Database-backed queue for publishing and archive exports.
+
+The web tier only adds a Job row; the worker (manage.py jobworker) claims
+queued jobs one at a time, keeps their progress up to date and leaves
+archives in the job directory under WRITABLE_DIR. Running jobs whose
+progress has not been written for JOB_TIMEOUT (their worker died) are failed, and
+finished jobs are removed, archive and all, after JOB_KEEP_DAYS.
+"""
+
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+import json
+import os
+import time
+import traceback
+
+from asrbank.settings import WRITABLE_DIR
+from asrbank.transcription.models import *
+from asrbank.transcription.export import ExportRequest
+from asrbank.transcription.archive import descriptor_entries
+from asrbank.transcription.publish import publish_descriptors, ARCHIVES
+from asrbank.transcription.search import rebuild_index
+
+# Progress is written to the database after this many descriptors, or after this much time
+JOB_PROGRESS_STEP = 25
+JOB_HEARTBEAT = timedelta(minutes=1)
+# A running job that has not written its progress for this long is taken to be abandoned by its worker
+JOB_TIMEOUT = timedelta(minutes=30)
+# Finished jobs and their archives are removed after this many days
+JOB_KEEP_DAYS = 7
+
+
+def get_job_dir():
+    return os.path.abspath(os.path.join(WRITABLE_DIR, "jobs"))
+
+def get_job_file(job):
+    """The file holding the archive produced by [job]"""
+    return os.path.join(get_job_dir(), job.artifact)
+
+def enqueue_job(sKind, request):
+    """Add a job of kind [sKind] for the user of [request] to the queue"""
+
+    oUser = request.user
+    return Job.objects.create(kind=sKind, owner=oUser, all_descriptors=oUser.is_superuser,
+                              base_url=request.build_absolute_uri("/").rstrip("/"))
+
+def get_job_queryset(job):
+    """The descriptors [job] works on"""
+
+    qs = Descriptor.objects.all()
+    if not job.all_descriptors:
+        qs = qs.filter(owner=job.owner)
+    return qs.order_by(Lower('identifier'), 'id')
+
+def fail_stale_jobs():
+    """Mark the running jobs whose progress has not been written for JOB_TIMEOUT as failed
+
+    Their worker was stopped or crashed: a working worker writes its progress
+    at least every JOB_HEARTBEAT. They are not queued again, since the job
+    may well be what brought the worker down. Returns the number of jobs failed.
+    """
+
+    dtStale = timezone.now() - JOB_TIMEOUT
+    return Job.objects.filter(status='running', updated__lt=dtStale).update(
+        status='error', finished=timezone.now(), message="The job was abandoned by its worker")
+
+def remove_old_jobs(iDays=None):
+    """Remove the jobs that finished more than [iDays] (default: JOB_KEEP_DAYS) days ago
+
+    Their archives go along with them (see job_deleted()). Returns the number of jobs removed.
+    """
+
+    if iDays == None:
+        iDays = JOB_KEEP_DAYS
+    qs = Job.objects.filter(status__in=['done', 'error'], finished__lt=timezone.now() - timedelta(days=iDays))
+    iCount = 0
+    # One at a time, so that post_delete removes the archive of each
+    for job in qs:
+        job.delete()
+        iCount += 1
+    return iCount
+
+def claim_job():
+    """Take the oldest queued job, or return None when there is none
+
+    The status is changed with a conditional UPDATE, so that two workers
+    can never run the same job. Abandoned jobs are failed first.
+    """
+
+    fail_stale_jobs()
+    for iId in Job.objects.filter(status='queued').order_by('id').values_list('id', flat=True):
+        dtNow = timezone.now()
+        if Job.objects.filter(id=iId, status='queued').update(status='running', started=dtNow, updated=dtNow) == 1:
+            return Job.objects.get(id=iId)
+    return None
+
+def set_progress(job, iDone, iTotal):
+    """Write the progress of [job], which also shows that its worker is still at it"""
+
+    dtNow = timezone.now()
+    if iDone == iTotal or iDone % JOB_PROGRESS_STEP == 0 or job.updated == None or dtNow - job.updated >= JOB_HEARTBEAT:
+        Job.objects.filter(id=job.id, status='running').update(done=iDone, total=iTotal, updated=dtNow)
+        job.updated = dtNow
+
+def run_job(job):
+    """Carry out [job] and record its outcome"""
+
+    request = ExportRequest(job.base_url)
+    qs = get_job_queryset(job)
+    oUpdate = {'status': 'done'}
+    try:
+        if job.kind == 'publish':
+            oResult = publish_descriptors(qs, request, progress=lambda iDone, iTotal: set_progress(job, iDone, iTotal))
+            oUpdate['result'] = json.dumps(oResult)
+        elif job.kind == 'index':
+            oUpdate['result'] = json.dumps({'indexed': rebuild_index()})
+        else:
+            (sName, make_archive, sContentType) = ARCHIVES[job.kind]
+            iTotal = qs.count()
+            set_progress(job, 0, iTotal)
+            job.artifact = "job_{:05d}_{}".format(job.id, sName)
+            fArchive = get_job_file(job)
+            os.makedirs(get_job_dir(), exist_ok=True)
+
+            def counted(entries):
+                for (iDone, tplEntry) in enumerate(entries, 1):
+                    yield tplEntry
+                    set_progress(job, iDone, iTotal)
+
+            with open(fArchive + ".tmp", mode="wb") as f:
+                for bChunk in make_archive(counted(descriptor_entries(qs, request))):
+                    f.write(bChunk)
+            os.replace(fArchive + ".tmp", fArchive)
+            oUpdate['artifact'] = job.artifact
+            oUpdate['done'] = iTotal
+    except Exception:
+        oUpdate = {'status': 'error', 'message': traceback.format_exc()}
+    oUpdate['finished'] = oUpdate['updated'] = timezone.now()
+    # A job that was taken to be abandoned in the meantime keeps its outcome
+    if Job.objects.filter(id=job.id, status='running').update(**oUpdate) == 0 and 'artifact' in oUpdate:
+        os.remove(get_job_file(job))
+
+def run_jobs(bOnce=False, iSleep=5):
+    """Run queued jobs; wait [iSleep] seconds for new ones unless [bOnce] is set
+
+    Returns the number of jobs that were run.
+    """
+
+    iCount = 0
+    remove_old_jobs()
+    while True:
+        job = claim_job()
+        if job != None:
+            run_job(job)
+            iCount += 1
+            remove_old_jobs()
+        elif bOnce:
+            return iCount
+        else:
+            time.sleep(iSleep)
+
+def job_deleted(sender, instance, **kwargs):
+    """The archive of a removed job is removed once the deletion is committed"""
+
+    if instance.artifact != "":
+        fArchive = get_job_file(instance)
+
+        def remove_archive():
+            for fName in (fArchive, fArchive + ".tmp"):
+                try:
+                    os.remove(fName)
+                except FileNotFoundError:
+                    pass
+
+        transaction.on_commit(remove_archive)
+
+def connect_job_deleted():
+    post_delete.connect(job_deleted, sender=Job, dispatch_uid="job_deleted")
+
+def get_job_status(job):
+    """The state of [job] as a dictionary (for the status endpoint)"""
+
+    oBack = {'id': job.id, 'kind': job.kind, 'status': job.status,
+             'done': job.done, 'total': job.total, 'message': job.message,
+             'result': None if job.result == "" else json.loads(job.result),
+             'download': None}
+    if job.status == 'done' and job.artifact != "":
+        oBack['download'] = reverse('job_download', kwargs={'pk': job.id})
+    return oBack
@@ -0,0 +1,21 @@
+"""
+Run the publish and export jobs that were queued from the web tier.
+"""
+
+from django.core.management.base import BaseCommand
+
+from asrbank.transcription.jobs import run_jobs
+
+
+class Command(BaseCommand):
+    help = "Run queued publish and export jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Exit when the queue is empty instead of waiting for new jobs")
+        parser.add_argument('--sleep', type=int, default=5,
+                            help="Seconds to wait before looking at an empty queue again")
+
+    def handle(self, *args, **options):
+        iCount = run_jobs(bOnce=options['once'], iSleep=options['sleep'])
+        self.stdout.write("{} job(s) run".format(iCount))
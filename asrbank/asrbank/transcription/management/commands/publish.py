@@ -0,0 +1,84 @@
+"""
+Publish the XML of the registry (or a part of it) to XML_DIR, e.g. from cron.
+
+Descriptors are handled in batches of ids, by one pool of worker
+processes for the whole run. Only the recording of the publications is
+done in a transaction, so that no transaction is held open while XML is
+generated. An interrupted run simply continues where it stopped the next
+time: published descriptors are no longer dirty.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from datetime import datetime, time
+
+from asrbank.settings import PUBLISH_BASE_URL, EXPORT_JOBS
+from asrbank.transcription.models import Descriptor
+from asrbank.transcription.export import ExportRequest, get_export_pool
+from asrbank.transcription.publish import publish_descriptors, update_archives
+
+
+class Command(BaseCommand):
+    help = "Publish the XML of the descriptors that changed since they were last published"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner', action='append', default=[],
+                            help="Only descriptors of this user (may be repeated)")
+        parser.add_argument('--id-from', type=int, help="Lowest descriptor id")
+        parser.add_argument('--id-to', type=int, help="Highest descriptor id")
+        parser.add_argument('--modified-since', help="Only descriptors modified since this date or date/time")
+        parser.add_argument('--jobs', type=int, default=EXPORT_JOBS,
+                            help="Number of worker processes (default: %(default)s)")
+        parser.add_argument('--batch', type=int, default=100, help="Descriptors per batch (default: %(default)s)")
+        parser.add_argument('--base-url', default=PUBLISH_BASE_URL,
+                            help="Scheme and host for the ResourceRef (default: %(default)s)")
+
+    def get_queryset(self, options):
+        qs = Descriptor.objects.all()
+        if options['owner']:
+            qs = qs.filter(owner__username__in=options['owner'])
+        if options['id_from'] != None:
+            qs = qs.filter(id__gte=options['id_from'])
+        if options['id_to'] != None:
+            qs = qs.filter(id__lte=options['id_to'])
+        if options['modified_since'] != None:
+            sSince = options['modified_since']
+            dtSince = parse_datetime(sSince)
+            if dtSince == None and parse_date(sSince) != None:
+                dtSince = datetime.combine(parse_date(sSince), time.min)
+            if dtSince == None:
+                raise CommandError("Not a date: {}".format(sSince))
+            if timezone.is_naive(dtSince):
+                dtSince = timezone.make_aware(dtSince)
+            qs = qs.filter(modified__gte=dtSince)
+        return qs
+
+    def handle(self, *args, **options):
+        request = ExportRequest(options['base_url'])
+        # Fix the selection first, so that it does not shift while publishing
+        lIds = list(self.get_queryset(options).order_by('id').values_list('id', flat=True))
+        iTotal = len(lIds)
+        iBatch = max(options['batch'], 1)
+        oTotal = {'written': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0}
+        lFailed = []
+
+        # The worker processes are started once, not for every batch
+        executor = get_export_pool(options['jobs'])
+        for iStart in range(0, iTotal, iBatch):
+            lBatch = lIds[iStart:iStart + iBatch]
+            oBack = publish_descriptors(Descriptor.objects.filter(id__in=lBatch).order_by('id'), request,
+                                        iJobs=options['jobs'], bArchives=False, executor=executor)
+            for sKey in oTotal:
+                oTotal[sKey] += oBack.get(sKey, 0)
+            lFailed.extend(oBack.get('errors', {}).items())
+            self.stdout.write("{}/{} descriptors: {} written, {} unchanged, {} up to date, {} invalid".format(
+                iStart + len(lBatch), iTotal, oTotal['written'], oTotal['unchanged'], oTotal['skipped'], oTotal['failed']))
+
+        for (sPidName, oFailed) in lFailed:
+            for oError in oFailed['errors']:
+                self.stderr.write("{} ({}, {}): {}".format(oFailed['identifier'], oFailed['owner'], sPidName, oError['text']))
+        if update_archives():
+            self.stdout.write("Registry archives rebuilt")
+        if lFailed:
+            raise CommandError("{} descriptor(s) failed validation".format(len(lFailed)))
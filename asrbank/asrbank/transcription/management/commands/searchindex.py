@@ -0,0 +1,16 @@
+"""
+Rebuild the full-text index of the descriptors, e.g. after a bulk import
+that went around the model signals.
+"""
+
+from django.core.management.base import BaseCommand
+
+from asrbank.transcription.search import rebuild_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of the descriptors"
+
+    def handle(self, *args, **options):
+        iCount = rebuild_index()
+        self.stdout.write("{} descriptor(s) indexed".format(iCount))
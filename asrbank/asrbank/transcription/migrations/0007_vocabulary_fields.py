@@ -0,0 +1,187 @@
+# Generated by Django 4.1 on 2026-10-18 08:44
+
+import asrbank.transcription.models
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transcription', '0006_auto_20170330_1535'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='descriptor',
+            options={'verbose_name': 'metadata record'},
+        ),
+        migrations.RemoveField(
+            model_name='descriptor',
+            name='topicList',
+        ),
+        migrations.AddField(
+            model_name='descriptor',
+            name='access',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('descriptor.access'), max_length=5, verbose_name='Access to this record'),
+        ),
+        migrations.AddField(
+            model_name='descriptor',
+            name='landingPage',
+            field=models.URLField(default='', help_text=asrbank.transcription.models.HelpText('internal.landingpage'), verbose_name='URL of the landing page'),
+        ),
+        migrations.AddField(
+            model_name='descriptor',
+            name='pidname',
+            field=models.CharField(default='empty', max_length=255, verbose_name='Registry identifier'),
+        ),
+        migrations.AddField(
+            model_name='descriptor',
+            name='searchPage',
+            field=models.URLField(blank=True, help_text=asrbank.transcription.models.HelpText('internal.searchpage'), null=True, verbose_name='URL of the search page'),
+        ),
+        migrations.AddField(
+            model_name='helpchoice',
+            name='help_msg',
+            field=models.CharField(blank=True, default='', max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='format',
+            field=models.CharField(blank=True, help_text=asrbank.transcription.models.HelpText('annotation.format'), max_length=5, verbose_name='Annotation format'),
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='mode',
+            field=models.CharField(blank=True, help_text=asrbank.transcription.models.HelpText('annotation.mode'), max_length=5, verbose_name='Annotation mode'),
+        ),
+        migrations.AlterField(
+            model_name='annotation',
+            name='type',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('annotation.type'), max_length=5, verbose_name='Kind of annotation'),
+        ),
+        migrations.AlterField(
+            model_name='anonymisation',
+            name='name',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('anonymisation'), max_length=5, verbose_name='Anonymisation level'),
+        ),
+        migrations.AlterField(
+            model_name='availability',
+            name='name',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('interview.availability'), max_length=5, verbose_name='Availability'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='copyright',
+            field=models.TextField(blank=True, help_text=asrbank.transcription.models.HelpText('interview.copyright'), verbose_name='Copyright for this interview'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='identifier',
+            field=models.CharField(default='-', help_text=asrbank.transcription.models.HelpText('descriptor.identifier'), max_length=10, verbose_name='Unique short descriptor identifier (10 characters max)'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='interviewDate',
+            field=models.DateField(blank=True, default=datetime.datetime.today, help_text=asrbank.transcription.models.HelpText('interview.date'), verbose_name='Date of the interview'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='interviewId',
+            field=models.CharField(default='-', help_text=asrbank.transcription.models.HelpText('interview.id'), max_length=255, verbose_name='Interview ID'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='interviewLength',
+            field=models.TimeField(blank=True, default='00:00:00', help_text=asrbank.transcription.models.HelpText('interview.length'), verbose_name='Length in time of the interview'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='modality',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('interview.modality'), max_length=5, verbose_name='Modality'),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='owner',
+            field=models.ForeignKey(help_text=asrbank.transcription.models.HelpText('descriptor.owner'), on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='descriptor',
+            name='projectTitle',
+            field=models.CharField(default='-', help_text=asrbank.transcription.models.HelpText('project.title'), max_length=255, verbose_name='Project title'),
+        ),
+        migrations.AlterField(
+            model_name='fileformat',
+            name='name',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('interview.format'), max_length=5, verbose_name='Format of audio/video file'),
+        ),
+        migrations.AlterField(
+            model_name='genre',
+            name='name',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('interview.genre'), max_length=5, verbose_name='Genre'),
+        ),
+        migrations.AlterField(
+            model_name='helpchoice',
+            name='help_url',
+            field=models.URLField(blank=True, default='', null=True),
+        ),
+        migrations.AlterField(
+            model_name='language',
+            name='name',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('interview.language'), max_length=5, verbose_name='Language used in interview'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='age',
+            field=models.CharField(blank=True, help_text=asrbank.transcription.models.HelpText('participant.age'), max_length=255, verbose_name='Age of the person'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='code',
+            field=models.CharField(help_text=asrbank.transcription.models.HelpText('participant.code'), max_length=255, verbose_name='Code for this person'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='gender',
+            field=models.CharField(blank=True, default='0', help_text=asrbank.transcription.models.HelpText('participant.gender'), max_length=5, verbose_name='Gender of the person'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='name',
+            field=models.CharField(blank=True, help_text=asrbank.transcription.models.HelpText('participant.name'), max_length=255, verbose_name='Name of the person'),
+        ),
+        migrations.AlterField(
+            model_name='spatialcoverage',
+            name='country',
+            field=models.CharField(default='0', help_text=asrbank.transcription.models.HelpText('coverage.spatial.country'), max_length=5, verbose_name='Spatial coverage: Country'),
+        ),
+        migrations.AlterField(
+            model_name='spatialcoverage',
+            name='place',
+            field=models.CharField(blank=True, help_text=asrbank.transcription.models.HelpText('coverage.spatial.city'), max_length=80, verbose_name='Place (city) for this spatial coverage'),
+        ),
+        migrations.AlterField(
+            model_name='temporalcoverage',
+            name='endYear',
+            field=models.CharField(help_text='Please use the following format: <em>YYYY</em>.', max_length=20, verbose_name='Last year covered by the interview'),
+        ),
+        migrations.AlterField(
+            model_name='temporalcoverage',
+            name='startYear',
+            field=models.CharField(help_text='Please use the following format: <em>YYYY</em>.', max_length=20, verbose_name='First year covered by the interview'),
+        ),
+        migrations.CreateModel(
+            name='Topic',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text=asrbank.transcription.models.HelpText('interview.topiclist'), max_length=255, verbose_name='Topic')),
+                ('descriptor', models.ForeignKey(default=1, on_delete=django.db.models.deletion.CASCADE, related_name='topics', to='transcription.descriptor')),
+            ],
+            options={
+                'verbose_name_plural': 'Topics',
+            },
+        ),
+    ]
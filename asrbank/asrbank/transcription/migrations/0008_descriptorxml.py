@@ -0,0 +1,25 @@
+# Generated by Django 4.1 on 2026-10-18 08:49
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0007_vocabulary_fields'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DescriptorXml',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource_ref', models.CharField(max_length=255)),
+                ('xsd_mtime', models.BigIntegerField(default=0)),
+                ('xml', models.TextField()),
+                ('created', models.DateTimeField(auto_now=True)),
+                ('descriptor', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='xmlcache', to='transcription.descriptor')),
+            ],
+        ),
+    ]
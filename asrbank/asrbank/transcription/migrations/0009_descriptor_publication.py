@@ -0,0 +1,28 @@
+# Generated by Django 4.1 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0008_descriptorxml'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='descriptor',
+            name='modified',
+            field=models.DateTimeField(auto_now=True, verbose_name='Last modified'),
+        ),
+        migrations.AddField(
+            model_name='descriptor',
+            name='published',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='Last published'),
+        ),
+        migrations.AddField(
+            model_name='descriptor',
+            name='published_hash',
+            field=models.CharField(blank=True, default='', editable=False, max_length=64, verbose_name='Hash of the published XML'),
+        ),
+    ]
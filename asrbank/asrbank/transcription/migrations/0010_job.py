@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-18 08:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transcription', '0009_descriptor_publication'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('publish', 'Publish'), ('zip', 'ZIP archive'), ('tar', 'tar.gz archive')], max_length=10, verbose_name='Kind')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('error', 'Error')], default='queued', max_length=10, verbose_name='Status')),
+                ('all_descriptors', models.BooleanField(default=False)),
+                ('base_url', models.CharField(max_length=255)),
+                ('done', models.IntegerField(default=0)),
+                ('total', models.IntegerField(default=0)),
+                ('result', models.TextField(blank=True, default='')),
+                ('artifact', models.CharField(blank=True, default='', max_length=255)),
+                ('message', models.TextField(blank=True, default='')),
+                ('created', models.DateTimeField(auto_now_add=True)),
+                ('started', models.DateTimeField(blank=True, null=True)),
+                ('finished', models.DateTimeField(blank=True, null=True)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created', '-id'],
+            },
+        ),
+    ]
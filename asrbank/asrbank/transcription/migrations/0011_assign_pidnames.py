@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def assign_pidnames(apps, schema_editor):
+    """Give every descriptor without a pidname its ohmetadata_<id> name, in one bulk_update"""
+
+    Descriptor = apps.get_model('transcription', 'Descriptor')
+    lDescr = list(Descriptor.objects.filter(pidname__in=("", "empty")).only('id', 'pidname'))
+    for descr_this in lDescr:
+        descr_this.pidname = "ohmetadata_{0:05d}".format(descr_this.id)
+    Descriptor.objects.bulk_update(lDescr, ['pidname'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0010_job'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_pidnames, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+def dedupe_descriptors(apps, schema_editor):
+    """Prepare for the unique pidname and (owner, identifier) constraints
+
+    Missing pidnames become NULL or ohmetadata_<id>. Of descriptors sharing a
+    pidname, the oldest keeps it and the others get their own ohmetadata_<id>.
+    Of descriptors sharing an owner and identifier, the oldest keeps the
+    identifier and the others get a numbered variant of it; nothing is deleted.
+    """
+
+    Descriptor = apps.get_model('transcription', 'Descriptor')
+    iMaxLen = Descriptor._meta.get_field('identifier').max_length
+    lDescr = list(Descriptor.objects.order_by('id').only('id', 'owner_id', 'identifier', 'pidname'))
+    setPidName = set()
+    setIdentifier = set((descr.owner_id, descr.identifier) for descr in lDescr)
+    setSeen = set()
+    lChanged = []
+    for descr_this in lDescr:
+        bChanged = False
+        sPidName = descr_this.pidname
+        if sPidName in (None, "", "empty") or sPidName in setPidName:
+            sPidName = "ohmetadata_{0:05d}".format(descr_this.id)
+            iNum = 1
+            while sPidName in setPidName:
+                iNum += 1
+                sPidName = "ohmetadata_{0:05d}_{1}".format(descr_this.id, iNum)
+            descr_this.pidname = sPidName
+            bChanged = True
+        setPidName.add(sPidName)
+        tplKey = (descr_this.owner_id, descr_this.identifier)
+        if tplKey in setSeen:
+            iNum = 1
+            while tplKey in setIdentifier:
+                iNum += 1
+                sSuffix = "~{}".format(iNum)
+                tplKey = (descr_this.owner_id, descr_this.identifier[:iMaxLen - len(sSuffix)] + sSuffix)
+            setIdentifier.add(tplKey)
+            descr_this.identifier = tplKey[1]
+            bChanged = True
+        setSeen.add(tplKey)
+        if bChanged:
+            lChanged.append(descr_this)
+    Descriptor.objects.bulk_update(lChanged, ['pidname', 'identifier'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0011_assign_pidnames'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_descriptors, migrations.RunPython.noop),
+    ]
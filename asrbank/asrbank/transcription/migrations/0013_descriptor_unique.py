@@ -0,0 +1,22 @@
+# Generated by Django 4.1 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0012_dedupe_descriptors'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='descriptor',
+            name='pidname',
+            field=models.CharField(blank=True, default=None, max_length=255, null=True, unique=True, verbose_name='Registry identifier'),
+        ),
+        migrations.AddConstraint(
+            model_name='descriptor',
+            constraint=models.UniqueConstraint(fields=('owner', 'identifier'), name='descriptor_owner_identifier'),
+        ),
+    ]
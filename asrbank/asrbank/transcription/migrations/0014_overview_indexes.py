@@ -0,0 +1,38 @@
+# Generated by Django 4.1 on 2026-10-18 09:02
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0013_descriptor_unique'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(django.db.models.functions.text.Lower('identifier'), models.F('id'), name='descriptor_identifier_ci'),
+        ),
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(models.F('owner'), django.db.models.functions.text.Lower('identifier'), models.F('id'), name='descriptor_owner_identifier_ci'),
+        ),
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(django.db.models.functions.text.Lower('projectTitle'), models.F('id'), name='descriptor_title_ci'),
+        ),
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(models.F('owner'), django.db.models.functions.text.Lower('projectTitle'), models.F('id'), name='descriptor_owner_title_ci'),
+        ),
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(models.F('interviewDate'), models.F('id'), name='descriptor_date'),
+        ),
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(models.F('owner'), models.F('interviewDate'), models.F('id'), name='descriptor_owner_date'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from django.db import migrations
+
+
+# (HelpChoice field, index column, text of a descriptor), as they were when the index was made
+SEARCH_COLUMNS = [
+    ("descriptor.identifier", 'identifier', lambda descr: descr.identifier),
+    ("project.title", 'title', lambda descr: descr.projectTitle),
+    ("interview.id", 'interview', lambda descr: descr.interviewId),
+    ("descriptor.owner", 'owner', lambda descr: descr.owner.username),
+    ("interview.topiclist", 'topics', lambda descr: " ".join([topic.name for topic in descr.topics.all()])),
+    ("participant.code", 'codes', lambda descr: " ".join([oPerson.code for oPerson in
+                                                          list(descr.interviewees.all()) + list(descr.interviewers.all())])),
+    ("participant.name", 'names', lambda descr: " ".join([oPerson.name for oPerson in
+                                                          list(descr.interviewees.all()) + list(descr.interviewers.all())])),
+    ("coverage.spatial.city", 'places', lambda descr: " ".join([cov.place for cov in descr.spatialcoverages.all()])),
+    ]
+SEARCH_BATCH = 200
+
+
+def index_descriptors(apps, schema_editor):
+    """Make the fields of the index searchable in HelpChoice and index all descriptors
+
+    The searchable flag was not used before, so it is switched on for the
+    existing help entries of the indexed fields.
+    """
+
+    HelpChoice = apps.get_model('transcription', 'HelpChoice')
+    Descriptor = apps.get_model('transcription', 'Descriptor')
+    for (sField, sColumn, get_text) in SEARCH_COLUMNS:
+        HelpChoice.objects.filter(field__iexact=sField).update(searchable=True)
+    sInsert = "INSERT INTO transcription_descriptor_fts (rowid, {}) VALUES (%s{})".format(
+        ", ".join([tplColumn[1] for tplColumn in SEARCH_COLUMNS]), ", %s" * len(SEARCH_COLUMNS))
+    qs = Descriptor.objects.select_related('owner').prefetch_related(
+        'topics', 'interviewees', 'interviewers', 'spatialcoverages').order_by('id')
+    lIds = list(qs.values_list('id', flat=True))
+    for iStart in range(0, len(lIds), SEARCH_BATCH):
+        lRows = [[descr_this.id] + [get_text(descr_this) for (sField, sColumn, get_text) in SEARCH_COLUMNS]
+                 for descr_this in qs.filter(id__in=lIds[iStart:iStart + SEARCH_BATCH])]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(sInsert, lRows)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0014_overview_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            "CREATE VIRTUAL TABLE transcription_descriptor_fts USING fts5("
+            "identifier, title, interview, owner, topics, codes, names, places, "
+            "tokenize='unicode61 remove_diacritics 2')",
+            "DROP TABLE transcription_descriptor_fts"),
+        migrations.RunPython(index_descriptors, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1 on 2026-10-18 09:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0015_descriptor_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='descriptor',
+            index=models.Index(models.F('modified'), name='descriptor_modified'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations, models
+import re
+
+
+def get_year(sYear):
+    m = re.match(r'^\s*(\d{1,4})\s*$', sYear or "")
+    return None if m == None else int(m.group(1))
+
+def fill_year_values(apps, schema_editor):
+    """Give every temporal coverage the numbers of its years; an unknown year takes the other one"""
+
+    TemporalCoverage = apps.get_model('transcription', 'TemporalCoverage')
+    lCoverages = list(TemporalCoverage.objects.only('id', 'startYear', 'endYear'))
+    for cov_this in lCoverages:
+        iStart = get_year(cov_this.startYear)
+        iEnd = get_year(cov_this.endYear)
+        cov_this.startYearValue = iEnd if iStart == None else iStart
+        cov_this.endYearValue = iStart if iEnd == None else iEnd
+    TemporalCoverage.objects.bulk_update(lCoverages, ['startYearValue', 'endYearValue'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0016_descriptor_modified'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='temporalcoverage',
+            options={'verbose_name_plural': 'Temporal coverages'},
+        ),
+        migrations.AddField(
+            model_name='temporalcoverage',
+            name='endYearValue',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='Last year (number)'),
+        ),
+        migrations.AddField(
+            model_name='temporalcoverage',
+            name='startYearValue',
+            field=models.IntegerField(blank=True, editable=False, null=True, verbose_name='First year (number)'),
+        ),
+        migrations.AddIndex(
+            model_name='temporalcoverage',
+            index=models.Index(fields=['startYearValue', 'endYearValue'], name='temporalcoverage_years'),
+        ),
+        migrations.RunPython(fill_year_values, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.1 on 2026-10-18 09:17
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0017_temporalcoverage_years'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VocabularyVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=0)),
+                ('changed', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='descriptorxml',
+            name='vocabulary',
+            field=models.IntegerField(default=0),
+        ),
+    ]
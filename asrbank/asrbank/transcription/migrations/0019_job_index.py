@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 09:22
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('transcription', '0018_vocabulary_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='kind',
+            field=models.CharField(choices=[('publish', 'Publish'), ('zip', 'ZIP archive'), ('tar', 'tar.gz archive'), ('index', 'Search index')], max_length=10, verbose_name='Kind'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='owner',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
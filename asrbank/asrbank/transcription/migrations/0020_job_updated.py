@@ -0,0 +1,26 @@
+# Generated by Django 4.1 on 2026-10-18 09:28
+
+from django.db import migrations, models
+
+
+def fill_updated(apps, schema_editor):
+    """A job that is running now was last heard of when it started"""
+
+    Job = apps.get_model('transcription', 'Job')
+    Job.objects.filter(status='running').update(updated=models.F('started'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('transcription', '0019_job_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_updated, migrations.RunPython.noop),
+    ]
@@ -6,16 +6,32 @@ The item has a number of characteristics.
 """
 
 from django.db import models
+from django.db.models.functions import Lower
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils.deconstruct import deconstructible
+from django.utils.text import capfirst
+from django import forms
 from django.contrib.auth.models import User
+from django.utils import timezone
 from datetime import datetime
 
 import copy  # (1) use python copy
+from functools import partial
+import re
 import sys
+import threading
+import time
 
 
 MAX_IDENTIFIER_LEN = 10
 MAX_STRING_LEN = 255
 
+# The persistent identifier of a descriptor: the number is padded, never truncated
+PIDNAME_FORMAT = "ohmetadata_{0:05d}"
+# Values that mean "no pidname yet" (only NULL is left after migration 0012)
+NO_PIDNAME = (None, "", "empty")
+
 INTERNAL_LANDINGPAGE = "internal.landingpage"
 INTERNAL_SEARCHPAGE = "internal.searchpage"
 
@@ -104,6 +120,190 @@ class HelpChoice(models.Model):
             return True
 
 
+class VocabularyVersion(models.Model):
+    """The version of the vocabulary (FieldChoice and HelpChoice): there is only one row
+
+    Every change raises the number, so that all processes can see that their
+    vocabulary cache is out of date.
+    """
+
+    # [1] Raised by each change
+    version = models.IntegerField(default=0)
+    # [1] When the vocabulary last changed
+    changed = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return "{} ({})".format(self.version, self.changed)
+
+
+def get_vocabulary_version():
+    """Get the (version, changed) of the vocabulary"""
+
+    oRow = VocabularyVersion.objects.filter(id=1).values_list('version', 'changed').first()
+    return (0, None) if oRow == None else oRow
+
+def raise_vocabulary_version():
+    if VocabularyVersion.objects.filter(id=1).update(version=models.F('version') + 1, changed=timezone.now()) == 0:
+        VocabularyVersion.objects.get_or_create(id=1, defaults={'version': 1})
+
+# The version in the database is looked at no more than once in so many seconds
+VOCABULARY_CHECK_SECONDS = 1.0
+
+
+class VocabularyCache(object):
+    """In-process copy of the FieldChoice and HelpChoice tables
+
+    All rows are loaded in one query the first time a label or value is needed.
+    The maps are keyed on the lower-cased field name, mirroring field__iexact:
+      english_map:  (field, machine_value)         -> english_name
+      value_map:    (field, english_name.lower())  -> machine_value
+      choice_map:   field -> [(machine_value, english_name)] in FieldChoice ordering
+      help_map:     field -> HelpChoice.Text() of the first matching entry
+      search_map:   field -> HelpChoice.searchable of the first matching entry
+    The cache is cleared by the post_save/post_delete receivers on FieldChoice and HelpChoice.
+    Changes made by other processes are noticed through VocabularyVersion (see check()).
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.changed = None
+        self.checked = None
+        self.loaded = False
+        self.english_map = {}
+        self.value_map = {}
+        self.choice_map = {}
+        self.help_loaded = False
+        self.help_map = {}
+        self.search_map = {}
+
+    def check(self):
+        """Empty the cache when the vocabulary has changed, possibly in another process"""
+
+        fNow = time.monotonic()
+        if self.checked != None and fNow - self.checked < VOCABULARY_CHECK_SECONDS:
+            return
+        (iVersion, dtChanged) = get_vocabulary_version()
+        if iVersion != self.version:
+            self.clear()
+            # Read before the tables, so that the maps are never older than the version
+            self.version = iVersion
+            self.changed = dtChanged
+        self.checked = fNow
+
+    def get_version(self):
+        """The version of the vocabulary that is (or will be) in the cache"""
+
+        self.check()
+        return self.version
+
+    def get_changed(self):
+        """When the vocabulary was last changed, or None if that is not known"""
+
+        self.check()
+        return self.changed
+
+    def load(self):
+        """Make sure the maps are filled"""
+
+        self.check()
+        if self.loaded: return
+        with self.lock:
+            if self.loaded: return
+            english_map = {}
+            value_map = {}
+            choice_map = {}
+            for field, english_name, machine_value in FieldChoice.objects.values_list(
+                    'field', 'english_name', 'machine_value'):
+                sField = field.lower()
+                # The first row wins, just as [0] on the queryset did
+                english_map.setdefault((sField, machine_value), english_name)
+                value_map.setdefault((sField, english_name.lower()), machine_value)
+                choice_map.setdefault(sField, []).append((machine_value, english_name))
+            self.english_map = english_map
+            self.value_map = value_map
+            self.choice_map = choice_map
+            self.loaded = True
+
+    def load_help(self):
+        """Make sure the help texts are filled"""
+
+        self.check()
+        if self.help_loaded: return
+        with self.lock:
+            if self.help_loaded: return
+            help_map = {}
+            search_map = {}
+            for entry in HelpChoice.objects.order_by('id'):
+                # Note: only take the first actual instance!!
+                help_map.setdefault(entry.field.lower(), entry.Text())
+                search_map.setdefault(entry.field.lower(), entry.searchable)
+            self.help_map = help_map
+            self.search_map = search_map
+            self.help_loaded = True
+
+    def clear(self):
+        with self.lock:
+            self.version = None
+            self.changed = None
+            self.checked = None
+            self.loaded = False
+            self.english_map = {}
+            self.value_map = {}
+            self.choice_map = {}
+            self.help_loaded = False
+            self.help_map = {}
+            self.search_map = {}
+
+    def english(self, field, num):
+        """Get the english_name for [field] with machine_value [num], or None"""
+
+        try:
+            iValue = int(num)
+        except (TypeError, ValueError):
+            return None
+        self.load()
+        return self.english_map.get((field.lower(), iValue))
+
+    def value(self, field, sEnglish):
+        """Get the machine_value for [field] with english_name [sEnglish], or None"""
+
+        self.load()
+        return self.value_map.get((field.lower(), str(sEnglish).lower()))
+
+    def choices(self, field):
+        """Get the list of (machine_value, english_name) tuples for [field]"""
+
+        self.load()
+        return self.choice_map.get(field.lower(), [])
+
+    def help(self, field):
+        """Get the help text for [field], or None"""
+
+        self.load_help()
+        return self.help_map.get(field.lower())
+
+    def searchable(self, field):
+        """Get the HelpChoice.searchable flag of [field], or None if it has no entry"""
+
+        self.load_help()
+        return self.search_map.get(field.lower())
+
+
+# There is one vocabulary cache per process
+vocabulary = VocabularyCache()
+
+
+@receiver(post_save, sender=FieldChoice)
+@receiver(post_delete, sender=FieldChoice)
+@receiver(post_save, sender=HelpChoice)
+@receiver(post_delete, sender=HelpChoice)
+def vocabulary_changed(sender, **kwargs):
+    """Any change in FieldChoice or HelpChoice invalidates the vocabulary cache of every process"""
+    raise_vocabulary_version()
+    vocabulary.clear()
+
+
 def build_choice_list(field, position=None, subcat=None, maybe_empty=False):
     """Create a list of choice-tuples"""
 
@@ -111,37 +311,31 @@ def build_choice_list(field, position=None, subcat=None, maybe_empty=False):
     unique_list = [];   # Check for uniqueness
 
     try:
-        # check if there are any options at all
-        if FieldChoice.objects == None:
-            # Take a default list
-            choice_list = [('0','-'),('1','N/A')]
-            unique_list = [('0','-'),('1','N/A')]
-        else:
-            if maybe_empty:
-                choice_list = [('0','-')]
-            for choice in FieldChoice.objects.filter(field__iexact=field):
-                # Default
-                sEngName = ""
-                # Any special position??
-                if position==None:
-                    sEngName = choice.english_name
-                elif position=='before':
-                    # We only need to take into account anything before a ":" sign
-                    sEngName = choice.english_name.split(':',1)[0]
-                elif position=='after':
-                    if subcat!=None:
-                        arName = choice.english_name.partition(':')
-                        if len(arName)>1 and arName[0]==subcat:
-                            sEngName = arName[2]
-
-                # Sanity check
-                if sEngName != "" and not sEngName in unique_list:
-                    # Add it to the REAL list
-                    choice_list.append((str(choice.machine_value),sEngName));
-                    # Add it to the list that checks for uniqueness
-                    unique_list.append(sEngName)
-
-            choice_list = sorted(choice_list,key=lambda x: x[1]);
+        if maybe_empty:
+            choice_list = [('0','-')]
+        for (machine_value, english_name) in vocabulary.choices(field):
+            # Default
+            sEngName = ""
+            # Any special position??
+            if position==None:
+                sEngName = english_name
+            elif position=='before':
+                # We only need to take into account anything before a ":" sign
+                sEngName = english_name.split(':',1)[0]
+            elif position=='after':
+                if subcat!=None:
+                    arName = english_name.partition(':')
+                    if len(arName)>1 and arName[0]==subcat:
+                        sEngName = arName[2]
+
+            # Sanity check
+            if sEngName != "" and not sEngName in unique_list:
+                # Add it to the REAL list
+                choice_list.append((str(machine_value),sEngName));
+                # Add it to the list that checks for uniqueness
+                unique_list.append(sEngName)
+
+        choice_list = sorted(choice_list,key=lambda x: x[1]);
     except:
         print("Unexpected error:", sys.exc_info()[0])
         choice_list = [('0','-'),('1','N/A')];
@@ -154,10 +348,10 @@ def choice_english(field, num):
     """Get the english name of the field with the indicated machine_number"""
 
     try:
-        result_list = FieldChoice.objects.filter(field__iexact=field).filter(machine_value=num)
-        if (result_list == None):
-            return "(No results for "+field+" with number="+num
-        return result_list[0].english_name
+        sEnglish = vocabulary.english(field, num)
+        if sEnglish == None:
+            return "(empty)"
+        return sEnglish
     except:
         return "(empty)"
 
@@ -165,10 +359,10 @@ def choice_value(field, sEnglish):
     """Get the machine value of the field with the indicated english_name"""
 
     try:
-        result_list = FieldChoice.objects.filter(field__iexact=field).filter(english_name__iexact=sEnglish)
-        if (result_list == None or len(result_list) == 0):
+        iValue = vocabulary.value(field, sEnglish)
+        if iValue == None:
             return -1
-        return result_list[0].machine_value
+        return iValue
     except:
         return -1
 
@@ -202,25 +396,107 @@ def copy_m2m(inst_src, inst_dst, field, lst_m2m = None):
 def get_help(field):
     """Create the 'help_text' for this element"""
 
-    # find the correct instance in the database
-    help_text = ""
+    # find the correct instance in the vocabulary cache
+    help_text = None
     try:
-        entry_list = HelpChoice.objects.filter(field__iexact=field)
-        entry = entry_list[0]
-        # Note: only take the first actual instance!!
-        help_text = entry.Text()
+        help_text = vocabulary.help(field)
     except:
+        pass
+    if help_text == None:
         help_text = "Sorry, no help available for " + field
 
     return help_text
 
 
+class ChoiceList(object):
+    """Choices of a model field, built from FieldChoice each time they are iterated
+
+    Nothing is read from the database when the model class is defined, and
+    changes in FieldChoice show up as soon as the vocabulary cache is cleared.
+    """
+
+    def __init__(self, field, maybe_empty=False):
+        self.field = field
+        self.maybe_empty = maybe_empty
+
+    def __iter__(self):
+        return iter(build_choice_list(self.field, maybe_empty=self.maybe_empty))
+
+
+@deconstructible
+class HelpText(object):
+    """Help text of a model field, looked up in HelpChoice when it is displayed
+
+    Migrations only record the HelpChoice field name, so editing help texts
+    does not lead to new migrations.
+    """
+
+    def __init__(self, field):
+        self.field = field
+
+    def __str__(self):
+        return get_help(self.field)
+
+    def __eq__(self, other):
+        return isinstance(other, HelpText) and self.field == other.field
+
+
+class ChoiceListField(models.CharField):
+    """CharField whose choices are a [ChoiceList] from FieldChoice"""
+
+    def deconstruct(self):
+        # The choices live in FieldChoice, not in the database schema:
+        #   hide them, so that Field.deconstruct() does not evaluate them
+        choices = self.choices
+        self.choices = None
+        try:
+            name, path, args, kwargs = super(ChoiceListField, self).deconstruct()
+        finally:
+            self.choices = choices
+        return name, "django.db.models.CharField", args, kwargs
+
+    def _check_choices(self):
+        # System checks must not read FieldChoice from the database
+        return []
+
+    def formfield(self, form_class=None, choices_form_class=None, **kwargs):
+        """Like Field.formfield(), but hand the choices on as a callable
+
+        This keeps the ModelForm classes in forms.py from reading FieldChoice when
+        they are defined: the choices are evaluated per form instance.
+        """
+
+        defaults = {'required': not self.blank,
+                    'label': capfirst(self.verbose_name),
+                    'help_text': self.help_text,
+                    'coerce': self.to_python}
+        if self.has_default():
+            if callable(self.default):
+                defaults['initial'] = self.default
+                defaults['show_hidden_initial'] = True
+            else:
+                defaults['initial'] = self.get_default()
+        include_blank = self.blank or not (self.has_default() or 'initial' in kwargs)
+        defaults['choices'] = partial(self.get_choices, include_blank=include_blank)
+        if self.null:
+            defaults['empty_value'] = None
+        # Only pass on what TypedChoiceField understands
+        for k in list(kwargs):
+            if k not in ('coerce', 'empty_value', 'choices', 'required', 'widget', 'label',
+                         'initial', 'help_text', 'error_messages', 'show_hidden_initial', 'disabled'):
+                del kwargs[k]
+        defaults.update(kwargs)
+        if choices_form_class == None:
+            choices_form_class = forms.TypedChoiceField
+        return choices_form_class(**defaults)
+
+
 class Language(models.Model):
     """Language that is used in a transcription"""
 
     # [1] Each language has a name
-    name = models.CharField("Language used in interview", choices=build_choice_list(INTERVIEW_LANGUAGE), max_length=5, 
-                            help_text=get_help(INTERVIEW_LANGUAGE), default='0')
+    name = ChoiceListField("Language used in interview", choices=ChoiceList(INTERVIEW_LANGUAGE), max_length=5, 
+                            help_text=HelpText(INTERVIEW_LANGUAGE), default='0')
     # [1]     Each descriptor can have [0-n] languages associated with it
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="languages")
 
@@ -234,8 +510,8 @@ class FileFormat(models.Model):
     """Format of an audio/video file"""
 
     # [1] File format language has a name
-    name = models.CharField("Format of audio/video file", choices=build_choice_list(AUDIOVIDEO_FORMAT), max_length=5, 
-                            help_text=get_help(AUDIOVIDEO_FORMAT), default='0')
+    name = ChoiceListField("Format of audio/video file", choices=ChoiceList(AUDIOVIDEO_FORMAT), max_length=5, 
+                            help_text=HelpText(AUDIOVIDEO_FORMAT), default='0')
     # [1]     Each descriptor can have [0-n] file formats associated with it
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="fileformats")
 
@@ -251,7 +527,7 @@ class Availability(models.Model):
     class Meta:
         verbose_name_plural = "Availability descriptions"
 
-    name = models.CharField("Availability", choices=build_choice_list(AVAILABILITY), max_length=5, help_text=get_help(AVAILABILITY), default='0')
+    name = ChoiceListField("Availability", choices=ChoiceList(AVAILABILITY), max_length=5, help_text=HelpText(AVAILABILITY), default='0')
     # [1]     Each descriptor can have [0-n] availability descriptors associated with it
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="availabilities")
 
@@ -265,14 +541,14 @@ class Participant(models.Model):
     """A participant of an interview"""
     
     # [1] Obligatory code
-    code = models.CharField("Code for this person",  max_length=MAX_STRING_LEN, blank=False, help_text=get_help(PARTICIPANT_CODE))
+    code = models.CharField("Code for this person",  max_length=MAX_STRING_LEN, blank=False, help_text=HelpText(PARTICIPANT_CODE))
     # [0-1] Name of the participant
-    name = models.CharField("Name of the person",  max_length=MAX_STRING_LEN, blank=True, help_text=get_help(PARTICIPANT_NAME))
+    name = models.CharField("Name of the person",  max_length=MAX_STRING_LEN, blank=True, help_text=HelpText(PARTICIPANT_NAME))
     # [0-1; closed] Gender of the participant
-    gender = models.CharField("Gender of the person", choices=build_choice_list(PARTICIPANT_GENDER, maybe_empty=True), max_length=5, 
-                              help_text=get_help(PARTICIPANT_GENDER), default='0', blank=True)
+    gender = ChoiceListField("Gender of the person", choices=ChoiceList(PARTICIPANT_GENDER, maybe_empty=True), max_length=5, 
+                              help_text=HelpText(PARTICIPANT_GENDER), default='0', blank=True)
     # [0-1] Age of the participant as STRING
-    age = models.CharField("Age of the person",  max_length=MAX_STRING_LEN, blank=True, help_text=get_help(PARTICIPANT_AGE))
+    age = models.CharField("Age of the person",  max_length=MAX_STRING_LEN, blank=True, help_text=HelpText(PARTICIPANT_AGE))
 
     def __str__(self):
         return self.code
@@ -310,7 +586,8 @@ class TemporalCoverage(models.Model):
     """Temporal coverage of a transcription"""
 
     class Meta:
-        verbose_name_plural = "Spatial coverages"
+        verbose_name_plural = "Temporal coverages"
+        indexes = [models.Index(fields=['startYearValue', 'endYearValue'], name='temporalcoverage_years')]
 
     # == Start year: yyyy
     startYear = models.CharField("First year covered by the interview", max_length=20, 
@@ -320,12 +597,23 @@ class TemporalCoverage(models.Model):
                                help_text="Please use the following format: <em>YYYY</em>.")
     # [1]     Each descriptor can have [0-n] spatial coverages associated with it
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="temporalcoverages")
+    # [0-1] The years as numbers, for range queries (see save() and temporal_overlap())
+    startYearValue = models.IntegerField("First year (number)", blank=True, null=True, editable=False)
+    endYearValue = models.IntegerField("Last year (number)", blank=True, null=True, editable=False)
 
     def __str__(self):
         idt = self.descriptor.identifier
         sBack = "[{}] {}-{}".format(idt,self.startYear, self.endYear)
         return sBack
 
+    def save(self, **kwargs):
+        # The numbers always follow the strings
+        (self.startYearValue, self.endYearValue) = get_year_range(self.startYear, self.endYear)
+        lUpdate = kwargs.get('update_fields')
+        if lUpdate != None and ('startYear' in lUpdate or 'endYear' in lUpdate):
+            kwargs['update_fields'] = list(lUpdate) + ['startYearValue', 'endYearValue']
+        return super(TemporalCoverage, self).save(**kwargs)
+
 
 class SpatialCoverage(models.Model):
     """Spatial coverage of a transcription"""
@@ -334,11 +622,11 @@ class SpatialCoverage(models.Model):
         verbose_name_plural = "Spatial coverages"
 
     # == country (0-1;c) (name+ISO-3166 code)
-    country = models.CharField("Spatial coverage: Country", 
-                               choices=build_choice_list(COVERAGE_SPATIAL_COUNTRY, maybe_empty=True), 
-                               max_length=5, help_text=get_help(COVERAGE_SPATIAL_COUNTRY), default='0')
+    country = ChoiceListField("Spatial coverage: Country", 
+                               choices=ChoiceList(COVERAGE_SPATIAL_COUNTRY, maybe_empty=True), 
+                               max_length=5, help_text=HelpText(COVERAGE_SPATIAL_COUNTRY), default='0')
     # [0-1] place
-    place = models.CharField("Place (city) for this spatial coverage", max_length=80, help_text=get_help(COVERAGE_SPATIAL_PLACE), blank=True)
+    place = models.CharField("Place (city) for this spatial coverage", max_length=80, help_text=HelpText(COVERAGE_SPATIAL_PLACE), blank=True)
     # [1]     Each descriptor can have [0-n] spatial coverages associated with it
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="spatialcoverages")
 
@@ -352,8 +640,8 @@ class Genre(models.Model):
     """Genre of transcription as a whole"""
 
     # (1; c)
-    name = models.CharField("Genre", choices=build_choice_list(INTERVIEW_GENRE), 
-                            max_length=5, help_text=get_help(INTERVIEW_GENRE), default='0')
+    name = ChoiceListField("Genre", choices=ChoiceList(INTERVIEW_GENRE), 
+                            max_length=5, help_text=HelpText(INTERVIEW_GENRE), default='0')
     # [1]     Each descriptor can have [1-n] genres
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="genres")
 
@@ -366,14 +654,14 @@ class Annotation(models.Model):
     """Description of one annotation layer in a transcription"""
     
     # [1] default = orthography
-    type = models.CharField("Kind of annotation", choices=build_choice_list(ANNOTATION_TYPE), max_length=5, 
-                            help_text=get_help(ANNOTATION_TYPE), default='0')
+    type = ChoiceListField("Kind of annotation", choices=ChoiceList(ANNOTATION_TYPE), max_length=5, 
+                            help_text=HelpText(ANNOTATION_TYPE), default='0')
     # [0-1]
-    mode = models.CharField("Annotation mode", choices=build_choice_list(ANNOTATION_MODE, maybe_empty=True), max_length=5, 
-                            help_text=get_help(ANNOTATION_MODE), blank = True)
+    mode = ChoiceListField("Annotation mode", choices=ChoiceList(ANNOTATION_MODE, maybe_empty=True), max_length=5, 
+                            help_text=HelpText(ANNOTATION_MODE), blank = True)
     # [0-1]
-    format = models.CharField("Annotation format", choices=build_choice_list(ANNOTATION_FORMAT, maybe_empty=True), max_length=5, 
-                              help_text=get_help(ANNOTATION_FORMAT), blank = True)
+    format = ChoiceListField("Annotation format", choices=ChoiceList(ANNOTATION_FORMAT, maybe_empty=True), max_length=5, 
+                              help_text=HelpText(ANNOTATION_FORMAT), blank = True)
     # [1]     Each descriptor can have [0-n] annotations
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="annotations")
 
@@ -394,8 +682,8 @@ class Anonymisation(models.Model):
         verbose_name_plural = "Anonymisation levels"
 
     # (1; c)
-    name = models.CharField("Anonymisation level", choices=build_choice_list(ANONYMISATION), max_length=5, 
-                            help_text=get_help(ANONYMISATION), default='0')
+    name = ChoiceListField("Anonymisation level", choices=ChoiceList(ANONYMISATION), max_length=5, 
+                            help_text=HelpText(ANONYMISATION), default='0')
     # [1]     Each descriptor can have [0-n] anonymisation levels
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="anonymisations")
 
@@ -411,7 +699,7 @@ class Topic(models.Model):
         verbose_name_plural = "Topics"
 
     # [1]
-    name = models.CharField("Topic",  max_length=MAX_STRING_LEN, help_text=get_help(TOPICLIST))
+    name = models.CharField("Topic",  max_length=MAX_STRING_LEN, help_text=HelpText(TOPICLIST))
     # [1] Each descriptor can have [0-n] topics
     descriptor = models.ForeignKey("Descriptor", blank=False, null=False, default=1, on_delete=models.CASCADE, related_name="topics")
 
@@ -426,46 +714,46 @@ class Descriptor(models.Model):
     # ============ INTERNAL FIELDS ================================
     # identifier (1)
     identifier = models.CharField("Unique short descriptor identifier (10 characters max)", 
-                                  max_length=MAX_IDENTIFIER_LEN, default='-', help_text=get_help(DESCRIPTOR_IDENTIFIER))
+                                  max_length=MAX_IDENTIFIER_LEN, default='-', help_text=HelpText(DESCRIPTOR_IDENTIFIER))
 
     # Owner of this descriptor (1)
-    owner = models.ForeignKey(User, blank=False, null=False, on_delete=models.CASCADE, help_text=get_help(DESCRIPTOR_OWNER))
+    owner = models.ForeignKey(User, blank=False, null=False, on_delete=models.CASCADE, help_text=HelpText(DESCRIPTOR_OWNER))
 
     # who has access to this particular record? (1)
-    access = models.CharField("Access to this record", choices=build_choice_list(DESCRIPTOR_ACCESS), max_length=5, 
-                            help_text=get_help(DESCRIPTOR_ACCESS), default='0')
+    access = ChoiceListField("Access to this record", choices=ChoiceList(DESCRIPTOR_ACCESS), max_length=5, 
+                            help_text=HelpText(DESCRIPTOR_ACCESS), default='0')
 
     # the persistent identifier name by which this descriptor is going to be recognized
     pidname = models.CharField("Registry identifier", 
-                               max_length=MAX_STRING_LEN, default="empty")
+                               max_length=MAX_STRING_LEN, blank=True, null=True, unique=True, default=None)
     # Landing Page (1)
-    landingPage = models.URLField("URL of the landing page", help_text=get_help(INTERNAL_LANDINGPAGE), default='')
+    landingPage = models.URLField("URL of the landing page", help_text=HelpText(INTERNAL_LANDINGPAGE), default='')
     # Search Page (0-1)
-    searchPage = models.URLField("URL of the search page", help_text=get_help(INTERNAL_SEARCHPAGE), blank=True, null=True)
+    searchPage = models.URLField("URL of the search page", help_text=HelpText(INTERNAL_SEARCHPAGE), blank=True, null=True)
 
     # ------------ ADMINISTRATIVE --------------
     # [1] Project title
     projectTitle = models.CharField("Project title", max_length=MAX_STRING_LEN, blank=False, 
-                                    help_text=get_help(PROJECT_TITLE), default="-")
+                                    help_text=HelpText(PROJECT_TITLE), default="-")
     # [1] ID of the interview
     interviewId = models.CharField("Interview ID", max_length=MAX_STRING_LEN, blank=False, 
-                                   help_text=get_help(INTERVIEW_ID), default="-")
+                                   help_text=HelpText(INTERVIEW_ID), default="-")
     # [0-1; YYYY-MM-DD]
-    interviewDate = models.DateField("Date of the interview", default=datetime.today, blank=True, help_text=get_help(INTERVIEW_DATE))
+    interviewDate = models.DateField("Date of the interview", default=datetime.today, blank=True, help_text=HelpText(INTERVIEW_DATE))
     # [0-1; HH:MM:SS]
-    interviewLength = models.TimeField("Length in time of the interview", default="00:00:00", blank=True, help_text=get_help(INTERVIEW_LENGTH))
+    interviewLength = models.TimeField("Length in time of the interview", default="00:00:00", blank=True, help_text=HelpText(INTERVIEW_LENGTH))
     # [1-n; closed] - Language
     # [0-n; closed] - FileFormat
     # [0-n; closed] - Availability
     # [0-1] Copyright description
-    copyright = models.TextField("Copyright for this interview", blank=True, help_text=get_help(COPYRIGHT))
+    copyright = models.TextField("Copyright for this interview", blank=True, help_text=HelpText(COPYRIGHT))
 
     # ------------- DESCRIPTIVE ---------------
     # [1-n]  - Interviewee
     # [1-n]  - Interviewer
 
     # [0-1]  - Topic list: OLD
-    # topicList =  models.TextField("List of topics for this interview", blank=True, help_text=get_help(TOPICLIST))
+    # topicList =  models.TextField("List of topics for this interview", blank=True, help_text=HelpText(TOPICLIST))
     # ---- NEW: use the following ---
     # [0-n]  - Topic list
     # [0-n; YYYY-YYYY]     - Temporal coverages
@@ -473,13 +761,36 @@ class Descriptor(models.Model):
     # [1-n; closed]        - Genres
 
     # [1] Modality
-    modality = models.CharField("Modality", choices=build_choice_list(INTERVIEW_MODALITY), max_length=5, 
-                            help_text=get_help(INTERVIEW_MODALITY), default='0')
+    modality = ChoiceListField("Modality", choices=ChoiceList(INTERVIEW_MODALITY), max_length=5, 
+                            help_text=HelpText(INTERVIEW_MODALITY), default='0')
     # [0-n] Annotations
     # [0-n] Anonymisation levels
 
+    # ------------- PUBLICATION ---------------
+    # [1] Last change of this descriptor or one of its child rows
+    modified = models.DateTimeField("Last modified", auto_now=True)
+    # [0-1] When the XML of this descriptor was last published
+    published = models.DateTimeField("Last published", blank=True, null=True, editable=False)
+    # [0-1] SHA-256 of the XML that was last published
+    published_hash = models.CharField("Hash of the published XML", max_length=64, blank=True, default="", editable=False)
+
     class Meta:
         verbose_name = "metadata record"
+        constraints = [
+            # An owner uses each identifier once; this is also the index for owner lookups
+            models.UniqueConstraint(fields=['owner', 'identifier'], name='descriptor_owner_identifier'),
+            ]
+        # The sort keys of the overview, for all descriptors and per owner (see paging.py)
+        indexes = [
+            models.Index(Lower('identifier'), 'id', name='descriptor_identifier_ci'),
+            models.Index('owner', Lower('identifier'), 'id', name='descriptor_owner_identifier_ci'),
+            models.Index(Lower('projectTitle'), 'id', name='descriptor_title_ci'),
+            models.Index('owner', Lower('projectTitle'), 'id', name='descriptor_owner_title_ci'),
+            models.Index('interviewDate', 'id', name='descriptor_date'),
+            models.Index('owner', 'interviewDate', 'id', name='descriptor_owner_date'),
+            # The latest modification is the data version of the facet counts (see facets.py)
+            models.Index('modified', name='descriptor_modified'),
+            ]
 
 
     def __str__(self):
@@ -490,9 +801,9 @@ class Descriptor(models.Model):
     identifier_column.short_description = "identifier"
 
     def get_pidname(self):
-        if self.pidname == "" or self.pidname == "empty":
-            self.pidname = "ohmetadata_{0:05d}".format(self.id)
-            self.save()
+        """The pidname is assigned on creation; this does not touch the database"""
+        if self.pidname in NO_PIDNAME:
+            return make_pidname(self.id)
         return self.pidname
 
     @classmethod
@@ -510,7 +821,171 @@ class Descriptor(models.Model):
     def save(self, **kwargs):
         # Do the initial saving
         instance = super(Descriptor, self).save(**kwargs)
+        # A new descriptor gets its pidname right away
+        if self.pidname in NO_PIDNAME:
+            self.pidname = make_pidname(self.id)
+            Descriptor.objects.filter(id=self.id).update(pidname=self.pidname)
         # Check for obligatory 1-n relations
         genres = self.genres.all()
 
 
+def get_year(sYear):
+    """Get the year in [sYear] as a number, or None for 'unknown', '-' or anything else that is not a year"""
+
+    m = re.match(r'^\s*(\d{1,4})\s*$', sYear or "")
+    return None if m == None else int(m.group(1))
+
+def get_year_range(sStart, sEnd):
+    """Get the (first, last) year numbers of a temporal coverage from [sStart] and [sEnd]
+
+    When only one of the years is known, the coverage is taken to be that
+    single year. When neither is known, both are None.
+    """
+
+    iStart = get_year(sStart)
+    iEnd = get_year(sEnd)
+    if iStart == None:
+        iStart = iEnd
+    if iEnd == None:
+        iEnd = iStart
+    return (iStart, iEnd)
+
+def temporal_overlap(iFrom=None, iTo=None):
+    """The temporal coverages that overlap the years [iFrom] to [iTo] (both included; None is open-ended)
+
+    This is a range scan on the (startYearValue, endYearValue) index.
+    """
+
+    qs = TemporalCoverage.objects.filter(startYearValue__isnull=False)
+    if iTo != None:
+        qs = qs.filter(startYearValue__lte=iTo)
+    if iFrom != None:
+        qs = qs.filter(endYearValue__gte=iFrom)
+    return qs
+
+def temporal_filter(iFrom=None, iTo=None):
+    """The Q object selecting the descriptors with a temporal coverage that overlaps [iFrom] to [iTo]"""
+    return models.Q(id__in=temporal_overlap(iFrom, iTo).values('descriptor_id'))
+
+def make_pidname(iId):
+    return PIDNAME_FORMAT.format(iId)
+
+def no_pidname_filter():
+    """The Q object that selects descriptors without a pidname"""
+    return models.Q(pidname__isnull=True) | models.Q(pidname__in=NO_PIDNAME[1:])
+
+def assign_pidnames(qs=None):
+    """Give all descriptors in [qs] (default: all) that lack a pidname one, in one bulk_update
+
+    This covers descriptors that did not go through Descriptor.save(), e.g. bulk_create().
+    Returns the number of descriptors that got a pidname.
+    """
+
+    if qs == None:
+        qs = Descriptor.objects.all()
+    lDescr = list(qs.filter(no_pidname_filter()).only('id', 'pidname'))
+    for descr_this in lDescr:
+        descr_this.pidname = make_pidname(descr_this.id)
+    Descriptor.objects.bulk_update(lDescr, ['pidname'], batch_size=500)
+    return len(lDescr)
+
+
+class DescriptorXml(models.Model):
+    """Validated CMDI XML of one descriptor, as produced by the export"""
+
+    # [1] The descriptor this XML belongs to
+    descriptor = models.OneToOneField(Descriptor, on_delete=models.CASCADE, related_name="xmlcache")
+    # [1] The ResourceRef URL the XML was built with
+    resource_ref = models.CharField(max_length=MAX_STRING_LEN)
+    # [1] Modification time (in ns) of the XSD the XML was validated against
+    xsd_mtime = models.BigIntegerField(default=0)
+    # [1] The VocabularyVersion the labels in the XML were taken from
+    vocabulary = models.IntegerField(default=0)
+    # [1] The XML text itself
+    xml = models.TextField()
+    # [1] When this XML was produced
+    created = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return "[{}] {}".format(self.descriptor_id, self.created)
+
+
+# The models that hang under a Descriptor through a 'descriptor' foreign key
+DESCRIPTOR_CHILD_MODELS = [Language, FileFormat, Availability, Interviewee, Interviewer, TemporalCoverage,
+                           SpatialCoverage, Genre, Annotation, Anonymisation, Topic]
+
+
+def descriptor_changed(sender, instance, **kwargs):
+    """Saving or deleting a descriptor or one of its child rows invalidates its XML
+
+    A change in a child row also counts as a modification of the descriptor.
+    """
+
+    if sender == Descriptor:
+        descriptor_id = instance.id
+    else:
+        descriptor_id = instance.descriptor_id
+        if descriptor_id != None:
+            Descriptor.objects.filter(id=descriptor_id).update(modified=timezone.now())
+    if descriptor_id != None:
+        DescriptorXml.objects.filter(descriptor_id=descriptor_id).delete()
+
+def connect_descriptor_changed():
+    for model in [Descriptor] + DESCRIPTOR_CHILD_MODELS:
+        post_save.connect(descriptor_changed, sender=model, dispatch_uid="descriptor_changed_" + model.__name__)
+        post_delete.connect(descriptor_changed, sender=model, dispatch_uid="descriptor_changed_" + model.__name__)
+
+connect_descriptor_changed()
+
+@receiver(post_save, sender=FieldChoice)
+@receiver(post_delete, sender=FieldChoice)
+def fieldchoice_changed_xml(sender, **kwargs):
+    """Labels in the XML come from FieldChoice, so all cached XML is outdated
+
+    The published XML stays where it is until it is published again: the
+    vocabulary change time makes every descriptor dirty (see get_dirty_filter()).
+    """
+    DescriptorXml.objects.all().delete()
+
+
+JOB_KINDS = (('publish', 'Publish'), ('zip', 'ZIP archive'), ('tar', 'tar.gz archive'),
+             ('index', 'Search index'))
+JOB_STATUSES = (('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('error', 'Error'))
+
+
+class Job(models.Model):
+    """A publish or export request that is carried out by the job worker (manage.py jobworker)"""
+
+    # [1] What needs to be done
+    kind = models.CharField("Kind", max_length=MAX_IDENTIFIER_LEN, choices=JOB_KINDS)
+    # [1] Where the job is
+    status = models.CharField("Status", max_length=MAX_IDENTIFIER_LEN, choices=JOB_STATUSES, default='queued')
+    # [0-1] The user who asked for the job (none for the search index, see search.py)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="jobs", blank=True, null=True)
+    # [1] Only descriptors of the owner are included, unless this is set
+    all_descriptors = models.BooleanField(default=False)
+    # [1] Scheme and host of the site, for the ResourceRef of the XML
+    base_url = models.CharField(max_length=MAX_STRING_LEN)
+    # [1] Progress: descriptors done out of total
+    done = models.IntegerField(default=0)
+    total = models.IntegerField(default=0)
+    # [0-1] The outcome as JSON, e.g. the publication report
+    result = models.TextField(blank=True, default="")
+    # [0-1] Name of the file the job produced, in the job directory
+    artifact = models.CharField(max_length=MAX_STRING_LEN, blank=True, default="")
+    # [0-1] What went wrong
+    message = models.TextField(blank=True, default="")
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(blank=True, null=True)
+    # [0-1] Last time the worker wrote the progress (see jobs.fail_stale_jobs)
+    updated = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created', '-id']
+
+    def __str__(self):
+        return "{} [{}] {}".format(self.kind, self.id, self.status)
+
+    def is_active(self):
+        return self.status in ('queued', 'running')
@@ -0,0 +1,84 @@
+"""
+Keyset (cursor) pagination.
+
+A page is found by comparing with the sort key and id of the last row of
+the previous page, instead of an OFFSET that makes the database walk all
+rows before it. With an index on (sort key, id) every page costs the same.
+"""
+
+from django.db.models import Q
+import base64
+import json
+
+
+def encode_cursor(oKey, iId):
+    """Turn the sort key and id of a row into a string for a URL"""
+    sJson = json.dumps([oKey, iId], default=str)
+    return base64.urlsafe_b64encode(sJson.encode("utf-8")).decode("ascii")
+
+def decode_cursor(sCursor):
+    """Get the (sort key, id) from [sCursor], or None if it is not a valid cursor"""
+    try:
+        (oKey, iId) = json.loads(base64.urlsafe_b64decode(sCursor.encode("ascii")).decode("utf-8"))
+        return (oKey, int(iId))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+
+def row_value(oRow, sName):
+    """Get [sName] from a model instance or from a values() dictionary"""
+    return oRow[sName] if isinstance(oRow, dict) else getattr(oRow, sName)
+
+def seek_filter(oKey, iId, bForward=True):
+    """The Q object selecting the rows after (or, unless [bForward], before) sort key [oKey] and id [iId]
+
+    This is (sort_key, id) > (oKey, iId) written as sort_key >= oKey AND
+    (sort_key > oKey OR id > iId): the first part bounds the range that is
+    read from the index, where a plain OR of the two cases makes SQLite scan it.
+    """
+
+    if bForward:
+        return Q(sort_key__gte=oKey) & (Q(sort_key__gt=oKey) | Q(id__gt=iId))
+    else:
+        return Q(sort_key__lte=oKey) & (Q(sort_key__lt=oKey) | Q(id__lt=iId))
+
+def keyset_page(qs, bAscending=True, sAfter="", sBefore="", iSize=50):
+    """Get one page of [qs], which must be annotated with a 'sort_key'
+
+    The rows may be model instances or the dictionaries of a values() queryset.
+    Rows are ordered on (sort_key, id). The page starts after cursor [sAfter],
+    or ends before cursor [sBefore], or is the first page.
+    Returns a dictionary with the 'rows' and the 'next' and 'previous' cursors (or None).
+    """
+
+    tplAfter = decode_cursor(sAfter) if sAfter else None
+    tplBefore = decode_cursor(sBefore) if sBefore else None
+    # Going back means walking the other way and turning the result around
+    bBackward = (tplAfter == None and tplBefore != None)
+    bForward = (bAscending != bBackward)
+    tplCursor = tplBefore if bBackward else tplAfter
+
+    if tplCursor != None:
+        (oKey, iId) = tplCursor
+        qs = qs.filter(seek_filter(oKey, iId, bForward))
+    if bForward:
+        qs = qs.order_by('sort_key', 'id')
+    else:
+        qs = qs.order_by('-sort_key', '-id')
+
+    lRows = list(qs[:iSize + 1])
+    bMore = len(lRows) > iSize
+    lRows = lRows[:iSize]
+    if bBackward:
+        lRows.reverse()
+
+    oBack = {'rows': lRows, 'next': None, 'previous': None}
+    if len(lRows) > 0:
+        sFirst = encode_cursor(row_value(lRows[0], 'sort_key'), row_value(lRows[0], 'id'))
+        sLast = encode_cursor(row_value(lRows[-1], 'sort_key'), row_value(lRows[-1], 'id'))
+        if bBackward:
+            oBack['next'] = sLast
+            oBack['previous'] = sFirst if bMore else None
+        else:
+            oBack['next'] = sLast if bMore else None
+            oBack['previous'] = sFirst if tplCursor != None else None
+    return oBack
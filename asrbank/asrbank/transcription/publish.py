@@ -0,0 +1,309 @@
+"""
+Incremental publishing of descriptors to XML_DIR.
+
+Every descriptor is validated in one pass: the valid ones are published and
+the errors of the others are collected in a report.
+
+Only descriptors that changed since they were last published are
+regenerated, and a file is only rewritten when its bytes differ.
+This keeps file modification times stable for harvesters.
+
+The registry archives ohmeta_all.zip and ohmeta_all.tar.gz in WRITABLE_DIR
+are rebuilt from the published files whenever the set of published records
+changes, so that downloading them costs nothing at request time.
+"""
+
+from django.db import transaction
+from django.db.models import Q, F
+from django.db.models.signals import post_delete
+from django.db.models.functions import Lower
+from django.utils import timezone
+from datetime import datetime
+import gzip
+import hashlib
+import os
+import threading
+
+from asrbank.settings import WRITABLE_DIR, XML_DIR
+from asrbank.transcription.models import *
+from asrbank.transcription.export import *
+from asrbank.transcription.archive import stream_zip, stream_tar
+
+# The registry archives and the way they are made
+ARCHIVES = {'zip': ("ohmeta_all.zip", stream_zip, 'application/zip'),
+            'tar': ("ohmeta_all.tar.gz", stream_tar, 'application/x-gzip')}
+ARCHIVE_SIGNATURE = "ohmeta_all.sha256"
+# Publications are recorded in the database this many at a time
+PUBLISH_RECORD_BATCH = 100
+
+
+def get_publish_file(sPidName):
+    """The file in XML_DIR under which descriptor [sPidName] is published"""
+    return os.path.abspath(os.path.join(XML_DIR, sPidName + ".xml"))
+
+class PublishedIndex(object):
+    """In-process index of the pidnames that have a published file in XML_DIR
+
+    The directory is only read again when its modification time changes,
+    which happens whenever a file is added, replaced or removed.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.mtime = None
+        self.files = {}
+
+    def get(self, sPidName):
+        """Get the published file of [sPidName], or None"""
+
+        try:
+            iMtime = os.stat(XML_DIR).st_mtime_ns
+        except OSError:
+            return None
+        with self.lock:
+            if iMtime != self.mtime:
+                self.files = {}
+                for oEntry in os.scandir(XML_DIR):
+                    if oEntry.name.endswith(".xml") and oEntry.is_file():
+                        self.files[oEntry.name[:-len(".xml")]] = oEntry.path
+                self.mtime = iMtime
+            return self.files.get(sPidName)
+
+published_index = PublishedIndex()
+
+
+def get_dirty_filter():
+    """Get the Q object that selects descriptors whose published XML may be outdated"""
+
+    qDirty = Q(published__isnull=True) | Q(modified__gt=F('published'))
+    # A new XSD may change the outcome of the validation
+    iMtime = get_schema_mtime()
+    if iMtime > 0:
+        dtSchema = datetime.fromtimestamp(iMtime / 1e9, tz=timezone.utc)
+        qDirty = qDirty | Q(published__lt=dtSchema)
+    # New labels in the vocabulary change the XML as well
+    (iVersion, dtVocabulary) = get_vocabulary_version()
+    if dtVocabulary != None:
+        qDirty = qDirty | Q(published__lt=dtVocabulary)
+    return qDirty
+
+def get_hash(bData):
+    return hashlib.sha256(bData).hexdigest()
+
+def get_file_hash(fName):
+    """Get the hash of the contents of file [fName], or '' if it does not exist"""
+    try:
+        with open(fName, mode="rb") as f:
+            return get_hash(f.read())
+    except OSError:
+        return ""
+
+def write_if_changed(fName, bData, sHash, sOldHash):
+    """Write [bData] to [fName] unless the file already holds exactly these bytes
+
+    Returns True when the file was (re)written.
+    """
+
+    # The stored hash can only be trusted while the file is still there
+    if sOldHash == "" or not os.path.exists(fName):
+        sOldHash = get_file_hash(fName)
+    if sOldHash == sHash:
+        return False
+    # Write to a temporary file first, so that readers never see half a file
+    fTemp = fName + ".tmp"
+    with open(fTemp, mode="wb") as f:
+        f.write(bData)
+    os.replace(fTemp, fName)
+    return True
+
+def write_gzip(fName, bData, bForce):
+    """Keep the precompressed copy [fName].gz of [bData] next to [fName]
+
+    The copy is written when [bForce] is set or when it does not exist yet.
+    """
+
+    fGzip = fName + ".gz"
+    if bForce or not os.path.exists(fGzip):
+        fTemp = fGzip + ".tmp"
+        # No time stamp or name inside, so that the same XML always gives the same bytes
+        with open(fTemp, mode="wb") as f:
+            f.write(gzip.compress(bData, compresslevel=9, mtime=0))
+        os.replace(fTemp, fGzip)
+
+def get_archive_file(sName):
+    """The file in WRITABLE_DIR holding registry archive [sName] ('zip' or 'tar')"""
+    return os.path.abspath(os.path.join(WRITABLE_DIR, ARCHIVES[sName][0]))
+
+def get_archive_rows():
+    """Get (identifier, pidname, published_hash) of all descriptors with a published file"""
+
+    lBack = []
+    qs = Descriptor.objects.exclude(published=None).order_by(Lower('identifier'), 'id')
+    for (sIdentifier, sPidName, sHash) in qs.values_list('identifier', 'pidname', 'published_hash'):
+        if not sPidName in NO_PIDNAME and os.path.exists(get_publish_file(sPidName)):
+            lBack.append((sIdentifier, sPidName, sHash))
+    return lBack
+
+def archive_entries(lRows):
+    """Yield (file name, XML) for the published files of [lRows]"""
+
+    for (sIdentifier, sPidName, sHash) in lRows:
+        with open(get_publish_file(sPidName), mode="rb") as f:
+            yield (sIdentifier + ".xml", f.read())
+
+def get_signature_file():
+    return os.path.join(WRITABLE_DIR, ARCHIVE_SIGNATURE)
+
+def archives_current():
+    """Do the registry archives hold the records that are published now?
+
+    The signature is removed when a published record goes away (see remove_published()).
+    """
+    return os.path.exists(get_signature_file())
+
+def update_archives():
+    """Rebuild the registry archives when the set of published records has changed
+
+    Returns True when the archives were (re)written.
+    """
+
+    lRows = get_archive_rows()
+    sSignature = get_hash("\n".join("\t".join(tplRow) for tplRow in lRows).encode("utf-8"))
+    fSignature = get_signature_file()
+    try:
+        with open(fSignature, mode="r") as f:
+            sOldSignature = f.read().strip()
+    except OSError:
+        sOldSignature = ""
+    bExists = all(os.path.exists(get_archive_file(sName)) for sName in ARCHIVES)
+    if sSignature == sOldSignature and bExists:
+        return False
+
+    for sName in ARCHIVES:
+        fArchive = get_archive_file(sName)
+        fTemp = fArchive + ".tmp"
+        with open(fTemp, mode="wb") as f:
+            for bChunk in ARCHIVES[sName][1](archive_entries(lRows)):
+                f.write(bChunk)
+        os.replace(fTemp, fArchive)
+    with open(fSignature, mode="w") as f:
+        f.write(sSignature)
+    return True
+
+def record_published(lPublished, dtRead):
+    """Mark the descriptors in [lPublished], a list of (id, hash), as published at [dtRead]
+
+    The XML has been written already; only this is done in a transaction.
+    """
+
+    with transaction.atomic():
+        for (iId, sHash) in lPublished:
+            # Record the publication without touching [modified]
+            Descriptor.objects.filter(id=iId).update(published=dtRead, published_hash=sHash)
+    del lPublished[:]
+
+def publish_descriptors(qs, request, progress=None, iJobs=None, bArchives=True, executor=None):
+    """Publish the XML of those descriptors in [qs] that are not up to date in XML_DIR
+
+    When given, [progress] is called with the number of descriptors done and the total.
+    [iJobs] is the number of worker processes and [executor] a pool to use for
+    them (see generate_descriptor_xml).
+    The registry archives are brought up to date afterwards, unless [bArchives] is False.
+
+    Returns a dictionary with:
+      status:    'published', 'empty' or 'error' (when at least one descriptor is invalid)
+      written:   number of files that were (re)written
+      unchanged: number of regenerated descriptors whose file already was up to date
+      skipped:   number of descriptors that did not need to be regenerated
+      failed:    number of descriptors that did not pass validation
+      errors:    pidname -> {'identifier', 'owner', 'errors'} of those descriptors, where
+                 'errors' is the list of errors (see xsd_error_dicts); identifiers
+                 are only unique per owner
+      archives:  True when the registry archives were rebuilt
+    """
+
+    oBack = {'status': 'unknown', 'written': 0, 'unchanged': 0, 'skipped': 0, 'failed': 0, 'errors': {}}
+    if qs == None or not qs.exists():
+        oBack['status'] = 'empty'
+        return oBack
+
+    # Assuming all goes well
+    oBack['status'] = 'published'
+    qDirty = get_dirty_filter()
+
+    # Clean descriptors only need their file to be present
+    lMissing = []
+    for (iId, sPidName) in qs.exclude(qDirty).values_list('id', 'pidname'):
+        if sPidName in NO_PIDNAME or not os.path.exists(get_publish_file(sPidName) + ".gz") or \
+           not os.path.exists(get_publish_file(sPidName)):
+            lMissing.append(iId)
+        else:
+            oBack['skipped'] += 1
+    qsDirty = qs.filter(qDirty | Q(id__in=lMissing))
+    iDone = oBack['skipped']
+    iTotal = iDone + qsDirty.count()
+    if progress != None:
+        progress(iDone, iTotal)
+
+    # Descriptors that bypassed save() may still lack a pidname
+    assign_pidnames(qsDirty)
+
+    # A descriptor counts as published at the time it was read: any change made
+    # while publishing is still running leaves it dirty for the next round
+    dtRead = timezone.now()
+
+    # Walk all the descriptors that need to be regenerated
+    lPublished = []
+    for (descr_this, bValid, sXmlText, lErrors) in generate_descriptor_xml(qsDirty, request, iJobs, executor):
+        sPidName = descr_this.pidname
+        if bValid:
+            bData = sXmlText.encode("utf-8")
+            sHash = get_hash(bData)
+            fPublish = get_publish_file(sPidName)
+            if write_if_changed(fPublish, bData, sHash, descr_this.published_hash):
+                oBack['written'] += 1
+                write_gzip(fPublish, bData, True)
+            else:
+                oBack['unchanged'] += 1
+                write_gzip(fPublish, bData, False)
+            lPublished.append((descr_this.id, sHash))
+            if len(lPublished) >= PUBLISH_RECORD_BATCH:
+                record_published(lPublished, dtRead)
+        else:
+            # Report the errors and carry on: this descriptor stays unpublished
+            oBack['status'] = 'error'
+            oBack['failed'] += 1
+            oBack['errors'][sPidName] = {'identifier': descr_this.identifier, 'owner': descr_this.owner.username,
+                                         'errors': lErrors}
+        iDone += 1
+        if progress != None:
+            progress(iDone, iTotal)
+
+    record_published(lPublished, dtRead)
+
+    # Whatever has been published goes into the registry archives
+    oBack['archives'] = update_archives() if bArchives else False
+
+    # Return the status
+    return oBack
+
+
+def remove_published(sPidName):
+    """Take the published files of [sPidName] out of the registry and mark the archives as outdated"""
+
+    fPublish = get_publish_file(sPidName)
+    for fName in (fPublish, fPublish + ".gz", get_signature_file()):
+        try:
+            os.remove(fName)
+        except FileNotFoundError:
+            pass
+
+def descriptor_deleted(sender, instance, **kwargs):
+    """A deleted descriptor leaves the registry once the deletion is committed"""
+
+    if not instance.pidname in NO_PIDNAME:
+        sPidName = instance.pidname
+        transaction.on_commit(lambda: remove_published(sPidName))
+
+def connect_descriptor_deleted():
+    post_delete.connect(descriptor_deleted, sender=Descriptor, dispatch_uid="descriptor_deleted")
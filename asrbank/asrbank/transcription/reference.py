@@ -0,0 +1,108 @@
+"""
+Indexed access to the ISO 639-3 and ISO 3166 reference lists in settings.
+
+LANGUAGE_CODE_LIST and COUNTRY_CODES are walked once, the first time they
+are needed, to build hash indexes and sorted prefix lists.
+"""
+
+from bisect import bisect_left
+from functools import lru_cache
+
+from asrbank.settings import LANGUAGE_CODE_LIST, COUNTRY_CODES
+
+
+class ReferenceIndex(object):
+    """Hash indexes and a prefix list over one reference list"""
+
+    def __init__(self):
+        self.by_key = {}
+        self.by_code = {}
+        self.prefix_items = []
+        self.prefix_keys = []
+        self.prefix_values = []
+
+    def add_key(self, sKey, oValue, bPrefix=True):
+        # The first entry in the list wins, just like a linear scan would
+        if not sKey in self.by_key:
+            self.by_key[sKey] = oValue
+            if bPrefix:
+                self.prefix_items.append((sKey.lower(), oValue))
+
+    def add_code(self, sCode, oValue):
+        self.by_code.setdefault(sCode, oValue)
+
+    def finish(self):
+        """Build the sorted prefix list from the lower-cased keys"""
+        lSorted = sorted(self.prefix_items)
+        self.prefix_items = []
+        self.prefix_keys = [sKey for (sKey, oValue) in lSorted]
+        self.prefix_values = [oValue for (sKey, oValue) in lSorted]
+
+    def starting_with(self, sPrefix, iMax=20):
+        """Get at most [iMax] values whose key starts with [sPrefix] (case insensitive)"""
+
+        lBack = []
+        sPrefix = sPrefix.lower()
+        iPos = bisect_left(self.prefix_keys, sPrefix)
+        while iPos < len(self.prefix_keys) and len(lBack) < iMax and \
+              self.prefix_keys[iPos].startswith(sPrefix):
+            lBack.append(self.prefix_values[iPos])
+            iPos += 1
+        return lBack
+
+
+@lru_cache(maxsize=None)
+def language_index():
+    """Index LANGUAGE_CODE_LIST: lower-case name -> (name, code) and code -> (name, code)"""
+
+    oIndex = ReferenceIndex()
+    for (sCode, sId, sName) in LANGUAGE_CODE_LIST:
+        oIndex.add_key(sName.lower(), (sName, sCode))
+        oIndex.add_code(sCode, (sName, sCode))
+    oIndex.finish()
+    return oIndex
+
+@lru_cache(maxsize=None)
+def country_index():
+    """Index COUNTRY_CODES: english name -> tuple, and alpha-2/alpha-3/numeric code -> tuple
+
+    A name such as "Netherlands (the)" can also be found as "Netherlands".
+    """
+
+    oIndex = ReferenceIndex()
+    for tplCountry in COUNTRY_CODES:
+        sName = tplCountry[1]
+        oIndex.add_key(sName, tplCountry)
+        if sName.endswith(" (the)"):
+            oIndex.add_key(sName[:-len(" (the)")], tplCountry, bPrefix=False)
+        # Alpha2, Alpha3 and Numeric codes
+        for sCode in (tplCountry[0], tplCountry[3], tplCountry[4]):
+            oIndex.add_code(sCode, tplCountry)
+    oIndex.finish()
+    return oIndex
+
+def language_code(sName):
+    """Get the ISO 639-3 code for language [sName] (case insensitive), or None"""
+    tplLang = language_index().by_key.get(sName.lower())
+    return None if tplLang == None else tplLang[1]
+
+def language_name(sCode):
+    """Get the first language name listed for ISO 639-3 code [sCode], or None"""
+    tplLang = language_index().by_code.get(sCode)
+    return None if tplLang == None else tplLang[0]
+
+def languages_starting_with(sPrefix, iMax=20):
+    """Get (name, code) tuples of languages whose name starts with [sPrefix]"""
+    return language_index().starting_with(sPrefix, iMax)
+
+def country_by_name(sName):
+    """Get the COUNTRY_CODES tuple for english name [sName], or None"""
+    return country_index().by_key.get(sName)
+
+def country_by_code(sCode):
+    """Get the COUNTRY_CODES tuple for an alpha-2, alpha-3 or numeric code, or None"""
+    return country_index().by_code.get(str(sCode).upper())
+
+def countries_starting_with(sPrefix, iMax=20):
+    """Get COUNTRY_CODES tuples of countries whose english name starts with [sPrefix]"""
+    return country_index().starting_with(sPrefix, iMax)
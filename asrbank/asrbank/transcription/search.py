@@ -0,0 +1,200 @@
+"""
+Full-text search over the descriptors.
+
+The index is an SQLite FTS5 table with one row per descriptor (the rowid is
+the descriptor id) and one column per field in SEARCH_COLUMNS. Only the
+fields that are searchable according to HelpChoice are filled. The
+post_save/post_delete receivers below keep the index up to date (once per
+descriptor per transaction, after it is committed), and the
+unicode61 tokenizer folds case and diacritics, so that 'zoe' finds 'Zoë'.
+When the searchable fields change, the whole index is rebuilt by the job
+worker (manage.py jobworker).
+"""
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import pre_save, pre_delete, post_save, post_delete
+import re
+import threading
+
+from asrbank.transcription.models import *
+
+SEARCH_TABLE = "transcription_descriptor_fts"
+# Descriptors are (re)indexed this many at a time
+SEARCH_BATCH = 200
+
+
+def participant_text(descr, sAttr):
+    lParticipants = list(descr.interviewees.all()) + list(descr.interviewers.all())
+    return " ".join([getattr(oPerson, sAttr) for oPerson in lParticipants])
+
+# (HelpChoice field, index column, bm25 weight, text of a descriptor)
+SEARCH_COLUMNS = [
+    (DESCRIPTOR_IDENTIFIER, 'identifier', 10.0, lambda descr: descr.identifier),
+    (PROJECT_TITLE, 'title', 5.0, lambda descr: descr.projectTitle),
+    (INTERVIEW_ID, 'interview', 5.0, lambda descr: descr.interviewId),
+    (DESCRIPTOR_OWNER, 'owner', 2.0, lambda descr: descr.owner.username),
+    (TOPICLIST, 'topics', 3.0, lambda descr: " ".join([topic.name for topic in descr.topics.all()])),
+    (PARTICIPANT_CODE, 'codes', 3.0, lambda descr: participant_text(descr, 'code')),
+    (PARTICIPANT_NAME, 'names', 3.0, lambda descr: participant_text(descr, 'name')),
+    (COVERAGE_SPATIAL_PLACE, 'places', 2.0, lambda descr: " ".join([cov.place for cov in descr.spatialcoverages.all()])),
+    ]
+# The child rows whose text is in the index
+SEARCH_CHILD_MODELS = [Topic, Interviewee, Interviewer, SpatialCoverage]
+
+
+def get_search_fields():
+    """The HelpChoice fields that are indexed: all of SEARCH_COLUMNS, unless HelpChoice says otherwise"""
+    return [sField for (sField, sColumn, fWeight, get_text) in SEARCH_COLUMNS if vocabulary.searchable(sField) != False]
+
+def index_queryset(qs):
+    return qs.select_related('owner').prefetch_related('topics', 'interviewees', 'interviewers', 'spatialcoverages')
+
+def write_index(qs, lIds, lFields):
+    """Replace the index rows of the descriptors with ids [lIds] by those of [qs], filling the fields [lFields]
+
+    Descriptors of [lIds] that are not in [qs] (e.g. deleted ones) lose their row.
+    """
+
+    lRows = []
+    for descr_this in index_queryset(qs.filter(id__in=lIds)):
+        lRows.append([descr_this.id] + [get_text(descr_this) if sField in lFields else ""
+                                        for (sField, sColumn, fWeight, get_text) in SEARCH_COLUMNS])
+    with connection.cursor() as cursor:
+        cursor.executemany("DELETE FROM {} WHERE rowid = %s".format(SEARCH_TABLE), [[iId] for iId in lIds])
+        cursor.executemany("INSERT INTO {} (rowid, {}) VALUES (%s{})".format(
+            SEARCH_TABLE, ", ".join([tplColumn[1] for tplColumn in SEARCH_COLUMNS]), ", %s" * len(SEARCH_COLUMNS)), lRows)
+
+def index_descriptors(lIds):
+    """Bring the index rows of the descriptors with ids [lIds] up to date"""
+
+    lFields = get_search_fields()
+    for iStart in range(0, len(lIds), SEARCH_BATCH):
+        write_index(Descriptor.objects.all(), lIds[iStart:iStart + SEARCH_BATCH], lFields)
+
+def rebuild_index(qs=None, lFields=None):
+    """Index all descriptors of [qs] (default: all) again, from an empty index
+
+    Returns the number of descriptors indexed.
+    """
+
+    if qs == None:
+        qs = Descriptor.objects.all()
+    if lFields == None:
+        lFields = get_search_fields()
+    with connection.cursor() as cursor:
+        cursor.execute("DELETE FROM {}".format(SEARCH_TABLE))
+    lIds = list(qs.order_by('id').values_list('id', flat=True))
+    for iStart in range(0, len(lIds), SEARCH_BATCH):
+        write_index(qs, lIds[iStart:iStart + SEARCH_BATCH], lFields)
+    return len(lIds)
+
+def make_match(sQuery):
+    """Turn what a user typed into an FTS5 query: each word must occur, possibly as the start of a longer word
+
+    The words are quoted, so that nothing the user types is taken as FTS5 syntax.
+    """
+    return " ".join(['"{}"*'.format(sWord) for sWord in re.findall(r'\w+', sQuery)])
+
+def search_filter(sQuery):
+    """The Q object that selects the descriptors matching [sQuery]"""
+
+    sMatch = make_match(sQuery)
+    if sMatch == "":
+        return Q(id__in=[])
+    return Q(id__in=RawSQL("SELECT rowid FROM {0} WHERE {0} MATCH %s".format(SEARCH_TABLE), [sMatch]))
+
+def search_descriptors(sQuery, bPublished=False, iLimit=50):
+    """Get the ids of at most [iLimit] descriptors matching [sQuery], best match first
+
+    When [bPublished] is set, only descriptors that have been published are included.
+    """
+
+    sMatch = make_match(sQuery)
+    if sMatch == "":
+        return []
+    sWeights = ", ".join([str(tplColumn[2]) for tplColumn in SEARCH_COLUMNS])
+    sSql = "SELECT d.id FROM {0} JOIN {1} d ON d.id = {0}.rowid WHERE {0} MATCH %s".format(
+        SEARCH_TABLE, Descriptor._meta.db_table)
+    if bPublished:
+        sSql += " AND d.published IS NOT NULL"
+    sSql += " ORDER BY bm25({0}, {1}), d.id LIMIT %s".format(SEARCH_TABLE, sWeights)
+    with connection.cursor() as cursor:
+        cursor.execute(sSql, [sMatch, iLimit])
+        return [row[0] for row in cursor.fetchall()]
+
+
+# The ids of the descriptors that changed in the current transaction, per thread
+pending_index = threading.local()
+
+def flush_index():
+    """Index the descriptors that changed, now that the transaction is committed"""
+
+    lIds = sorted(getattr(pending_index, 'ids', set()))
+    pending_index.ids = set()
+    if len(lIds) > 0:
+        index_descriptors(lIds)
+
+def schedule_index(lIds):
+    """Have the descriptors with ids [lIds] indexed once the transaction is committed
+
+    Each descriptor is indexed once, however many of its rows change. When a
+    transaction is rolled back, its ids are indexed with the next commit,
+    which does no harm: the index is always made from what is in the database.
+    """
+
+    if not hasattr(pending_index, 'ids'):
+        pending_index.ids = set()
+    pending_index.ids.update(lIds)
+    transaction.on_commit(flush_index)
+
+def search_changed(sender, instance, **kwargs):
+    """A descriptor, or a child row with searchable text, was saved or deleted"""
+
+    if sender == Descriptor:
+        lIds = [instance.id]
+    else:
+        oOrigin = kwargs.get('origin')
+        if oOrigin != None and not isinstance(oOrigin, sender) and getattr(oOrigin, 'model', None) != sender:
+            # Deleted along with its descriptor (or its owner), which takes the index row along
+            return
+        lIds = [instance.descriptor_id]
+    if lIds[0] != None:
+        schedule_index(lIds)
+
+def search_owner_changed(sender, instance, **kwargs):
+    """The username of an owner is in the index of all their descriptors"""
+
+    lUpdate = kwargs.get('update_fields')
+    if lUpdate == None or 'username' in lUpdate:
+        schedule_index(list(Descriptor.objects.filter(owner=instance).values_list('id', flat=True)))
+
+def enqueue_index_rebuild():
+    """Have the job worker rebuild the index, unless that is already waiting to be done"""
+
+    if not Job.objects.filter(kind='index', status='queued').exists():
+        Job.objects.create(kind='index', all_descriptors=True, base_url="")
+
+def search_fields_before(sender, instance, **kwargs):
+    """Remember the searchable fields before a change in HelpChoice"""
+    instance.search_fields_before = get_search_fields()
+
+def search_fields_changed(sender, instance, **kwargs):
+    """A change in HelpChoice may change which fields are searchable"""
+
+    lBefore = getattr(instance, 'search_fields_before', None)
+    if lBefore != None and get_search_fields() == lBefore:
+        return
+    transaction.on_commit(enqueue_index_rebuild)
+
+def connect_search_index():
+    for model in [Descriptor] + SEARCH_CHILD_MODELS:
+        post_save.connect(search_changed, sender=model, dispatch_uid="search_changed_" + model.__name__)
+        post_delete.connect(search_changed, sender=model, dispatch_uid="search_changed_" + model.__name__)
+    post_save.connect(search_owner_changed, sender=User, dispatch_uid="search_owner_changed")
+    pre_save.connect(search_fields_before, sender=HelpChoice, dispatch_uid="search_fields_before")
+    pre_delete.connect(search_fields_before, sender=HelpChoice, dispatch_uid="search_fields_before")
+    post_save.connect(search_fields_changed, sender=HelpChoice, dispatch_uid="search_fields_changed")
+    post_delete.connect(search_fields_changed, sender=HelpChoice, dispatch_uid="search_fields_changed")
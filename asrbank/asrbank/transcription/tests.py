@@ -4,7 +4,33 @@ when you run "manage.py test".
 """
 
 import django
-from django.test import TestCase
+from django.contrib.auth.models import User, Permission
+from django.test import TestCase, RequestFactory
+from django.core.management import call_command
+from django.db import IntegrityError, transaction, connection
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F
+from unittest import mock
+import os
+import tempfile
+import threading
+import io
+import zipfile
+import tarfile
+from datetime import timedelta
+import gzip
+import json
+from lxml import etree
+
+from asrbank.transcription.models import *
+from asrbank.transcription.export import *
+from asrbank.transcription.reference import *
+from asrbank.transcription.publish import *
+from asrbank.transcription.archive import *
+from asrbank.transcription.delivery import *
+from asrbank.transcription.jobs import *
+from asrbank.transcription.search import *
+from asrbank.transcription.paging import *
 
 # TODO: Configure your database in settings.py and sync before running tests.
 
@@ -32,3 +58,1060 @@ class ViewTest(TestCase):
         """Tests the about page."""
         response = self.client.get('/about')
         self.assertContains(response, 'About', 3, 200)
+
+
+class VocabularyTest(TestCase):
+    """Tests for the FieldChoice vocabulary cache."""
+
+    def setUp(self):
+        vocabulary.clear()
+        FieldChoice.objects.create(field="interview.genre", english_name="interviews", dutch_name="interviews", machine_value=1)
+        FieldChoice.objects.create(field="interview.genre", english_name="conversation", dutch_name="gesprek", machine_value=2)
+
+    def test_lookup_without_queries(self):
+        """Labels and values are resolved from the cache after one load."""
+        self.assertEqual(choice_english(INTERVIEW_GENRE, "2"), "conversation")
+        with self.assertNumQueries(0):
+            self.assertEqual(choice_english("Interview.Genre", 1), "interviews")
+            self.assertEqual(choice_value(INTERVIEW_GENRE, "Conversation"), 2)
+            self.assertEqual(choice_value(INTERVIEW_GENRE, "nothing"), -1)
+            self.assertEqual(choice_english(INTERVIEW_GENRE, None), "(empty)")
+
+    def test_other_process(self):
+        """A change made in another process is noticed through the version in the database."""
+        self.assertEqual(choice_english(INTERVIEW_GENRE, "2"), "conversation")
+        # What the receivers of another process do: no signal reaches this cache
+        FieldChoice.objects.filter(machine_value=2).update(english_name="chat")
+        raise_vocabulary_version()
+        self.assertEqual(choice_english(INTERVIEW_GENRE, "2"), "conversation")
+        with mock.patch("asrbank.transcription.models.VOCABULARY_CHECK_SECONDS", 0):
+            self.assertEqual(choice_english(INTERVIEW_GENRE, "2"), "chat")
+            self.assertEqual(vocabulary.get_version(), get_vocabulary_version()[0])
+
+    def test_invalidation(self):
+        """Saving or deleting a FieldChoice refreshes the cache."""
+        self.assertEqual(build_choice_list(INTERVIEW_GENRE), [('2', 'conversation'), ('1', 'interviews')])
+        FieldChoice.objects.filter(machine_value=2).get().delete()
+        self.assertEqual(choice_english(INTERVIEW_GENRE, 2), "(empty)")
+        FieldChoice.objects.create(field="interview.genre", english_name="lecture", dutch_name="lezing", machine_value=3)
+        self.assertEqual(build_choice_list(INTERVIEW_GENRE), [('1', 'interviews'), ('3', 'lecture')])
+
+    def test_lazy_choices(self):
+        """Model choices follow FieldChoice and stay out of migrations."""
+        field = Genre._meta.get_field('name')
+        self.assertEqual(list(field.choices), [('2', 'conversation'), ('1', 'interviews')])
+        FieldChoice.objects.create(field="interview.genre", english_name="lecture", dutch_name="lezing", machine_value=3)
+        self.assertIn(('3', 'lecture'), list(field.choices))
+        name, path, args, kwargs = field.deconstruct()
+        self.assertEqual(path, "django.db.models.CharField")
+        self.assertNotIn('choices', kwargs)
+        self.assertEqual(kwargs['help_text'], HelpText(INTERVIEW_GENRE))
+        HelpChoice.objects.create(field=INTERVIEW_GENRE, display_name="Genre", help_msg="kind of interview")
+        self.assertEqual(str(field.help_text), "(kind of interview)")
+
+
+class SchemaCacheTest(TestCase):
+    """Tests for the compiled XSD schema cache."""
+
+    xsd = """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema">
+  <xs:element name="{}" type="xs:string"/>
+</xs:schema>"""
+
+    def write_xsd(self, sName, iMtime):
+        with open(self.fSchema, encoding="utf-8", mode="w") as f:
+            f.write(self.xsd.format(sName))
+        os.utime(self.fSchema, (iMtime, iMtime))
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.fSchema = os.path.join(self.dir.name, "test.xsd")
+        self.write_xsd("first", 1000000)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_schema_reused_until_file_changes(self):
+        schema = get_compiled_schema(self.fSchema)
+        self.assertIs(get_compiled_schema(self.fSchema), schema)
+        self.assertTrue(schema.validate(etree.XML("<first>x</first>")))
+        # A new modification time means a new compilation
+        self.write_xsd("second", 2000000)
+        schema2 = get_compiled_schema(self.fSchema)
+        self.assertIsNot(schema2, schema)
+        self.assertTrue(schema2.validate(etree.XML("<second>x</second>")))
+
+    def test_schema_per_thread(self):
+        """Each thread validates with its own schema, so that no thread waits for another."""
+        schema = get_compiled_schema(self.fSchema)
+        lOther = []
+        oThread = threading.Thread(target=lambda: lOther.append(get_compiled_schema(self.fSchema)))
+        oThread.start()
+        oThread.join()
+        self.assertIsNot(lOther[0], schema)
+        self.assertIs(get_compiled_schema(self.fSchema), schema)
+
+    def test_broken_schema(self):
+        """A schema that does not compile is an error, not a failed validation."""
+        with open(self.fSchema, encoding="utf-8", mode="w") as f:
+            f.write('<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema"><xs:element/></xs:schema>')
+        os.utime(self.fSchema, (3000000, 3000000))
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as out:
+            with self.assertRaisesRegex(RuntimeError, "test.xsd could not be compiled: .*name"):
+                get_compiled_schema(self.fSchema)
+            with mock.patch("asrbank.transcription.export.getSchemaFile", return_value=self.fSchema):
+                with self.assertRaisesRegex(RuntimeError, "could not be compiled"):
+                    validateXml("<first>x</first>")
+        # Nothing is printed
+        self.assertEqual(out.getvalue(), "")
+
+
+def make_vocabulary():
+    """Fill FieldChoice with one value for each field used in the CMDI export"""
+
+    vocabulary.clear()
+    for (sField, sEnglish) in [(INTERVIEW_GENRE, "interviews"), (INTERVIEW_LANGUAGE, "Dutch"),
+                               (AUDIOVIDEO_FORMAT, "wav"), (AVAILABILITY, 'online & "free"'),
+                               (INTERVIEW_MODALITY, "spoken"), (ANONYMISATION, "other"),
+                               (PARTICIPANT_GENDER, "female"), (COVERAGE_SPATIAL_COUNTRY, "Netherlands"),
+                               (ANNOTATION_TYPE, "orthographicTranscription"), (ANNOTATION_MODE, "manual"),
+                               (ANNOTATION_FORMAT, "praat"), (DESCRIPTOR_ACCESS, "just me")]:
+        FieldChoice.objects.create(field=sField, english_name=sEnglish, dutch_name=sEnglish, machine_value=1)
+
+def make_descriptor(user, sIdentifier="oh1"):
+    """Create a descriptor with one or more rows for each of its child tables"""
+
+    descr = Descriptor.objects.create(identifier=sIdentifier, owner=user, projectTitle='Title <with> "quotes" & more',
+                                      interviewId="i1", interviewDate="2017-03-30",
+                                      interviewLength="01:02:03", modality="1")
+    Genre.objects.create(name="1", descriptor=descr)
+    Language.objects.create(name="1", descriptor=descr)
+    FileFormat.objects.create(name="1", descriptor=descr)
+    Availability.objects.create(name="1", descriptor=descr)
+    Anonymisation.objects.create(name="1", descriptor=descr)
+    Topic.objects.create(name="war", descriptor=descr)
+    Topic.objects.create(name="peace", descriptor=descr)
+    Interviewee.objects.create(code="A", name="Anne", gender="1", age="80", descriptor=descr)
+    Interviewer.objects.create(code="B", name="", gender="0", age="", descriptor=descr)
+    TemporalCoverage.objects.create(startYear="1940", endYear="1945", descriptor=descr)
+    SpatialCoverage.objects.create(country="1", place="Nijmegen", descriptor=descr)
+    Annotation.objects.create(type="1", mode="1", format="1", descriptor=descr)
+    return descr
+
+def build_invalid_tree(descr, request):
+    """Build the CMDI tree of [descr], with a wrong root element when the identifier is 'bad'"""
+
+    top = build_descriptor_tree(descr, request)
+    if descr.identifier == "bad":
+        top.tag = "{http://www.clarin.eu/cmd/}Wrong"
+    return top
+
+# Accepts any <CMD> document in the CMD namespace
+PERMISSIVE_XSD = """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="http://www.clarin.eu/cmd/">
+  <xs:element name="CMD">
+    <xs:complexType>
+      <xs:sequence><xs:any processContents="skip" minOccurs="0" maxOccurs="unbounded"/></xs:sequence>
+      <xs:anyAttribute processContents="skip"/>
+    </xs:complexType>
+  </xs:element>
+</xs:schema>"""
+
+# Accepts nothing at all
+STRICT_XSD = """<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" targetNamespace="http://www.clarin.eu/cmd/">
+  <xs:element name="Nothing" type="xs:string"/>
+</xs:schema>"""
+
+EXPECTED_XML = """<?xml version="1.0" ?>
+<CMD xmlns="http://www.clarin.eu/cmd/" xmlns:xsd="http://www.w3.org/2001/XMLSchema/" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance/" xsi:schemaLocation="http://www.clarin.eu/cmd/ https://catalog.clarin.eu/ds/ComponentRegistry/rest/registry/1.1/profiles/clarin.eu:cr1:p_1487686159240/xsd/" CMDVersion="1.1">
+  <Header>
+    <MdSelfLink/>
+    <MdProfile>clarin.eu:cr1:p_1487686159240</MdProfile>
+  </Header>
+  <Resources>
+    <ResourceProxyList>
+      <ResourceProxy id="oh_000000000001">
+        <ResourceType mimetype="application/sru+xml">SearchService</ResourceType>
+        <ResourceRef>http://testserver/</ResourceRef>
+      </ResourceProxy>
+    </ResourceProxyList>
+    <JournalFileProxyList/>
+    <ResourceRelationList/>
+  </Resources>
+  <Components>
+    <OralHistoryInterview>
+      <ProjectTitle>Title &lt;with&gt; &quot;quotes&quot; &amp; more</ProjectTitle>
+      <InterviewId>i1</InterviewId>
+      <InterviewDate>2017-03-30</InterviewDate>
+      <InterviewLength>01:02:03</InterviewLength>
+      <FileFormat>wav</FileFormat>
+      <Availability>online &amp; &quot;free&quot;</Availability>
+      <Genre>interviews</Genre>
+      <Modality>spoken</Modality>
+      <Anonymisation>other</Anonymisation>
+      <TopicList>
+        <Topic>war</Topic>
+        <Topic>peace</Topic>
+      </TopicList>
+      <Language>
+        <LanguageName>dutch</LanguageName>
+        <ISO639>
+          <iso-639-3-code>nld</iso-639-3-code>
+        </ISO639>
+      </Language>
+      <Interviewee>
+        <Code>A</Code>
+        <Name>Anne</Name>
+        <Gender>female</Gender>
+        <Age>80</Age>
+      </Interviewee>
+      <Interviewer>
+        <Code>B</Code>
+      </Interviewer>
+      <TemporalCoverage>
+        <startYear>1940</startYear>
+        <endYear>1945</endYear>
+      </TemporalCoverage>
+      <SpatialCoverage>
+        <Place>Nijmegen</Place>
+        <Country>
+          <CountryName>Netherlands (the)</CountryName>
+          <CountryCoding>NL</CountryCoding>
+        </Country>
+      </SpatialCoverage>
+      <Annotation>
+        <AnnotationType>orthographicTranscription</AnnotationType>
+        <AnnotationMode>manual</AnnotationMode>
+        <AnnotationFormat>praat</AnnotationFormat>
+      </Annotation>
+    </OralHistoryInterview>
+  </Components>
+</CMD>
+"""
+
+
+class ExportTest(TestCase):
+    """Tests for the CMDI export."""
+
+    def setUp(self):
+        make_vocabulary()
+        self.descr = make_descriptor(User.objects.create(username="owner"))
+        self.request = RequestFactory().get("/")
+
+    def test_pretty_output(self):
+        """The output keeps the layout of minidom's toprettyxml()."""
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            (bValid, sXml) = create_descriptor_xml(self.descr, self.request)
+        self.assertTrue(bValid)
+        self.assertEqual(sXml, EXPECTED_XML)
+
+    def test_compact_output(self):
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            (bValid, sXml) = create_descriptor_xml(self.descr, self.request, pretty=False)
+        self.assertTrue(bValid)
+        self.assertNotIn("\n", sXml)
+        parser = etree.XMLParser(remove_blank_text=True)
+        self.assertEqual(etree.tostring(etree.XML(sXml)), etree.tostring(etree.XML(EXPECTED_XML, parser)))
+
+    def test_cached_xml_vocabulary(self):
+        """XML stored with the labels of an older vocabulary version is not used."""
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            get_descriptor_xml(self.descr, self.request)
+            oCache = DescriptorXml.objects.get(descriptor=self.descr)
+            self.assertEqual(oCache.vocabulary, vocabulary.get_version())
+            # Another process stored XML made from labels that were out of date
+            DescriptorXml.objects.filter(id=oCache.id).update(vocabulary=oCache.vocabulary - 1, xml="<stale/>")
+            descr = Descriptor.objects.select_related('xmlcache').get(id=self.descr.id)
+            self.assertEqual(get_descriptor_xml(descr, self.request), (True, EXPECTED_XML))
+
+    def test_bulk_export_queries(self):
+        """A bulk export costs the same number of queries for any number of descriptors."""
+        for iNum in range(2, 5):
+            make_descriptor(self.descr.owner, "oh{}".format(iNum))
+        choice_english(INTERVIEW_GENRE, 1)
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            with self.assertNumQueries(1 + len(DESCRIPTOR_RELATIONS)):
+                # The owner is read along, for the error report of publish_descriptors()
+                lResults = [create_descriptor_xml(descr, self.request) + (descr.owner.username,)
+                            for descr in descriptors_for_export(Descriptor.objects.order_by('id'))]
+        self.assertEqual(len(lResults), 4)
+        lResults = [tplResult[:2] for tplResult in lResults]
+        self.assertEqual(lResults[0], (True, EXPECTED_XML))
+
+    def test_cached_xml(self):
+        """Validated XML is reused until the descriptor, a child row or the XSD changes."""
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            self.assertEqual(get_descriptor_xml(self.descr, self.request), (True, EXPECTED_XML))
+            self.assertEqual(DescriptorXml.objects.count(), 1)
+            descr = Descriptor.objects.get(id=self.descr.id)
+            with mock.patch("asrbank.transcription.export.create_descriptor_xml") as create:
+                self.assertEqual(get_descriptor_xml(descr, self.request), (True, EXPECTED_XML))
+                self.assertFalse(create.called)
+            # Changing a child row drops the cached XML
+            Topic.objects.create(name="home", descriptor=descr)
+            self.assertEqual(DescriptorXml.objects.count(), 0)
+            (bValid, sXml) = get_descriptor_xml(Descriptor.objects.get(id=self.descr.id), self.request)
+            self.assertIn("<Topic>home</Topic>", sXml)
+            # So does a new XSD
+            with mock.patch("asrbank.transcription.export.get_schema_mtime", return_value=12345):
+                with mock.patch("asrbank.transcription.export.create_descriptor_xml", return_value=(True, "new")):
+                    self.assertEqual(get_descriptor_xml(Descriptor.objects.get(id=self.descr.id), self.request), (True, "new"))
+
+    def test_parallel_export(self):
+        """Worker processes give the same results, in the same order, as a serial export."""
+        # The workers are forked with the schema that is patched in
+        shutdown_export_pools()
+        self.addCleanup(shutdown_export_pools)
+        for iNum in range(2, 7):
+            make_descriptor(self.descr.owner, "oh{}".format(iNum))
+        qs = Descriptor.objects.order_by('-identifier')
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            lParallel = [(descr.identifier, bValid, sXml) for (descr, bValid, sXml, lErrors) in generate_descriptor_xml(qs, self.request, 2)]
+            self.assertEqual(DescriptorXml.objects.count(), 6)
+            DescriptorXml.objects.all().delete()
+            lSerial = [(descr.identifier, bValid, sXml) for (descr, bValid, sXml, lErrors) in generate_descriptor_xml(qs, self.request, 1)]
+        self.assertEqual(lParallel, lSerial)
+        self.assertEqual([sIdentifier for (sIdentifier, bValid, sXml) in lParallel], ["oh6", "oh5", "oh4", "oh3", "oh2", "oh1"])
+        self.assertEqual(lParallel[-1], ("oh1", True, EXPECTED_XML))
+        # Errors come back from the workers as well (new workers, which see the other schema)
+        shutdown_export_pools()
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(STRICT_XSD))):
+            DescriptorXml.objects.all().delete()
+            lResults = list(generate_descriptor_xml(qs, self.request, 2))
+        self.assertFalse(any(bValid for (descr, bValid, sXml, lErrors) in lResults))
+        self.assertEqual(lResults[0][3][0]['line'], 2)
+        self.assertEqual(DescriptorXml.objects.count(), 0)
+
+    def test_invalid_output(self):
+        """Errors are reported against the lines of the serialized XML."""
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(STRICT_XSD))):
+            (bValid, sHtml) = create_descriptor_xml(self.descr, self.request)
+        self.assertFalse(bValid)
+        self.assertIn("<tr><td>2</td>", sHtml)
+
+
+class ReferenceTest(TestCase):
+    """Tests for the ISO 639-3 / ISO 3166 indexes."""
+
+    def test_language(self):
+        self.assertEqual(language_code("dutch"), "nld")
+        self.assertEqual(language_name("nld"), "Dutch")
+        self.assertIsNone(language_code("no such language"))
+        self.assertEqual(languages_starting_with("Dutch (", 2), [("Dutch (Flemish)", "nld"), ("Dutch (Northern)", "nld")])
+
+    def test_country(self):
+        tplNL = ("NL", "Netherlands (the)", "Pays-Bas (les)", "NLD", "528")
+        self.assertEqual(country_by_name("Netherlands"), tplNL)
+        self.assertEqual(country_by_name("Netherlands (the)"), tplNL)
+        self.assertEqual(country_by_code("nl"), tplNL)
+        self.assertEqual(country_by_code("NLD"), tplNL)
+        self.assertEqual(country_by_code(528), tplNL)
+        self.assertEqual(countries_starting_with("nether"), [tplNL])
+
+
+class PublishTest(TestCase):
+    """Tests for incremental publishing."""
+
+    def setUp(self):
+        make_vocabulary()
+        self.user = User.objects.create(username="owner")
+        self.descr = make_descriptor(self.user)
+        self.request = RequestFactory().get("/")
+        self.dir = tempfile.TemporaryDirectory()
+        lPatches = [mock.patch("asrbank.transcription.publish.XML_DIR", self.dir.name),
+                    mock.patch("asrbank.transcription.publish.WRITABLE_DIR", self.dir.name),
+                    mock.patch("asrbank.transcription.jobs.WRITABLE_DIR", self.dir.name),
+                    mock.patch("asrbank.transcription.export.getSchema",
+                               return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD)))]
+        for oPatch in lPatches:
+            oPatch.start()
+            self.addCleanup(oPatch.stop)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def publish(self):
+        return publish_descriptors(Descriptor.objects.all(), self.request)
+
+    def test_incremental(self):
+        oBack = self.publish()
+        self.assertEqual((oBack['status'], oBack['written'], oBack['skipped']), ('published', 1, 0))
+        fPublish = get_publish_file(Descriptor.objects.get(id=self.descr.id).pidname)
+        with open(fPublish, encoding="utf-8") as f:
+            self.assertEqual(f.read(), EXPECTED_XML)
+        # Nothing changed: nothing is regenerated
+        oBack = self.publish()
+        self.assertEqual((oBack['written'], oBack['unchanged'], oBack['skipped']), (0, 0, 1))
+        # A change in a child row marks the descriptor as dirty
+        os.utime(fPublish, (1000000, 1000000))
+        Topic.objects.create(name="home", descriptor=self.descr)
+        self.assertEqual(self.publish()['written'], 1)
+        self.assertNotEqual(os.stat(fPublish).st_mtime, 1000000)
+        # A change that does not alter the XML leaves the file alone
+        os.utime(fPublish, (1000000, 1000000))
+        Descriptor.objects.get(id=self.descr.id).save()
+        oBack = self.publish()
+        self.assertEqual((oBack['written'], oBack['unchanged']), (0, 1))
+        self.assertEqual(os.stat(fPublish).st_mtime, 1000000)
+        # A missing file is written again
+        os.remove(fPublish)
+        self.assertEqual(self.publish()['written'], 1)
+
+    def test_vocabulary_change(self):
+        """New labels make every descriptor dirty, but what is published stays published."""
+        self.publish()
+        descr = make_descriptor(self.user, "oh2")
+        self.publish()
+        with mock.patch("asrbank.transcription.models.timezone.now", return_value=timezone.now() + timedelta(days=1)):
+            FieldChoice.objects.filter(field=INTERVIEW_GENRE).update(english_name="talks")
+            FieldChoice.objects.filter(field=INTERVIEW_GENRE).get().save()
+        self.assertEqual(Descriptor.objects.filter(published=None).count(), 0)
+        self.assertEqual(Descriptor.objects.filter(get_dirty_filter()).count(), 2)
+        self.assertEqual([tplRow[1] for tplRow in get_archive_rows()], [self.descr.pidname, descr.pidname])
+        with mock.patch("asrbank.transcription.publish.timezone.now", return_value=timezone.now() + timedelta(days=2)):
+            oBack = self.publish()
+        self.assertEqual((oBack['written'], oBack['skipped']), (2, 0))
+        with open(get_publish_file(descr.pidname), encoding="utf-8") as f:
+            self.assertIn("talks", f.read())
+
+    def test_validation_report(self):
+        """Invalid descriptors are reported, and all valid ones are still published."""
+        bad = make_descriptor(self.user, "bad")
+        make_descriptor(self.user, "oh2")
+        # Another owner may use the same identifier: the report tells them apart
+        other_bad = make_descriptor(User.objects.create(username="other"), "bad")
+
+        with mock.patch("asrbank.transcription.export.build_descriptor_tree", side_effect=build_invalid_tree):
+            oBack = self.publish()
+        self.assertEqual((oBack['status'], oBack['written'], oBack['failed']), ('error', 2, 2))
+        self.assertEqual(sorted(oBack['errors']), sorted([bad.pidname, other_bad.pidname]))
+        oFailed = oBack['errors'][other_bad.pidname]
+        self.assertEqual((oFailed['identifier'], oFailed['owner']), ("bad", "other"))
+        oError = oFailed['errors'][0]
+        self.assertEqual((oError['line'], oError['type']), (2, "SCHEMAV_CVC_ELT_1"))
+
+    def test_publish_job(self):
+        """Publishing from the overview is left to the job worker, which reports back."""
+        bad = make_descriptor(self.user, "bad")
+
+        self.client.force_login(self.user)
+        response = self.client.get("/overview/", {'submit_type': 'publish', 'format': 'json'})
+        self.assertEqual(response.status_code, 202)
+        oStatus = response.json()
+        self.assertEqual(oStatus['status'], 'queued')
+        self.assertFalse(os.path.exists(get_publish_file(make_pidname(self.descr.id))))
+        with mock.patch("asrbank.transcription.export.build_descriptor_tree", side_effect=build_invalid_tree):
+            self.assertEqual(run_jobs(bOnce=True), 1)
+        oStatus = self.client.get("/jobs/{}/status".format(oStatus['id'])).json()
+        self.assertEqual((oStatus['status'], oStatus['done'], oStatus['total']), ('done', 2, 2))
+        self.assertEqual(oStatus['result']['written'], 1)
+        self.assertEqual(oStatus['result']['errors'][bad.pidname]['errors'][0]['line'], 2)
+        # The job page shows the report
+        self.assertContains(self.client.get("/jobs/{}/".format(oStatus['id'])), "SCHEMAV_CVC_ELT_1")
+        # Nobody else gets to see the job
+        self.client.force_login(User.objects.create(username="other"))
+        self.assertEqual(self.client.get("/jobs/{}/status".format(oStatus['id'])).status_code, 404)
+
+    def test_archive_job(self):
+        """A filtered overview gets its archive from the job worker."""
+        self.client.force_login(self.user)
+        response = self.client.get("/overview/", {'submit_type': 'zip'})
+        job = Job.objects.get()
+        self.assertRedirects(response, "/jobs/{}/".format(job.id))
+        run_jobs(bOnce=True)
+        oStatus = get_job_status(Job.objects.get(id=job.id))
+        self.assertEqual(oStatus['download'], "/jobs/{}/download".format(job.id))
+        response = self.client.get(oStatus['download'])
+        with zipfile.ZipFile(io.BytesIO(b"".join(response.streaming_content))) as archive:
+            self.assertEqual(archive.read("oh1.xml").decode("utf-8"), EXPECTED_XML)
+        response.close()
+
+    def test_stale_jobs(self):
+        """A job abandoned by its worker is failed, and old jobs are removed along with their archives."""
+        dtLong = timezone.now() - JOB_TIMEOUT - timedelta(minutes=1)
+        job = Job.objects.create(kind='publish', owner=self.user, base_url="http://testserver", status='running',
+                                 started=dtLong, updated=dtLong)
+        Job.objects.create(kind='publish', owner=self.user, base_url="http://testserver")
+        self.assertEqual(run_jobs(bOnce=True), 1)
+        job = Job.objects.get(id=job.id)
+        self.assertEqual(job.status, 'error')
+        self.assertNotEqual(job.finished, None)
+        # A job that started long ago but still writes its progress is left alone
+        Job.objects.filter(id=job.id).update(status='running', started=dtLong, updated=dtLong)
+        job = Job.objects.get(id=job.id)
+        set_progress(job, 1, 100)
+        self.assertEqual(fail_stale_jobs(), 0)
+        self.assertEqual(Job.objects.get(id=job.id).done, 1)
+        # A worker that was taken to be dead does not overwrite the outcome
+        Job.objects.filter(id=job.id).update(status='error', message="abandoned")
+        run_job(job)
+        self.assertEqual(Job.objects.get(id=job.id).message, "abandoned")
+        # Finished jobs are removed after JOB_KEEP_DAYS, archive and all
+        Job.objects.filter(id=job.id).update(status='done', finished=timezone.now())
+        self.client.force_login(self.user)
+        self.client.get("/overview/", {'submit_type': 'zip'})
+        archive_job = Job.objects.get(status='queued')
+        run_jobs(bOnce=True)
+        fArchive = get_job_file(Job.objects.get(id=archive_job.id))
+        self.assertTrue(os.path.exists(fArchive))
+        self.assertEqual(remove_old_jobs(), 0)
+        Job.objects.filter(id=archive_job.id).update(finished=timezone.now() - timedelta(days=JOB_KEEP_DAYS + 1))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(remove_old_jobs(), 1)
+        self.assertFalse(Job.objects.filter(id=archive_job.id).exists())
+        self.assertFalse(os.path.exists(fArchive))
+        self.assertTrue(Job.objects.filter(id=job.id).exists())
+
+    def test_pidnames(self):
+        """Pidnames are given on creation, so publishing never saves a descriptor."""
+        self.assertEqual(Descriptor.objects.get(id=self.descr.id).pidname, make_pidname(self.descr.id))
+        self.assertEqual(make_pidname(123456), "ohmetadata_123456")
+        Descriptor.objects.bulk_create([Descriptor(identifier="oh2", owner=self.user), Descriptor(identifier="oh3", owner=self.user)])
+        with self.assertNumQueries(2):
+            self.assertEqual(assign_pidnames(), 2)
+        self.assertFalse(Descriptor.objects.filter(no_pidname_filter()).exists())
+        with mock.patch.object(Descriptor, "save") as save:
+            self.publish()
+            self.assertFalse(save.called)
+
+    def test_registry(self):
+        """The registry serves published files without any query, and supports 304."""
+        self.publish()
+        sPidName = Descriptor.objects.get(id=self.descr.id).pidname
+        with self.assertNumQueries(0):
+            response = self.client.get("/registry/" + sPidName)
+            self.assertEqual(b"".join(response.streaming_content).decode("utf-8"), EXPECTED_XML)
+            response.close()
+            self.assertEqual(response['Content-Type'], "text/xml")
+            self.assertEqual(self.client.get("/registry/" + sPidName, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+            self.assertEqual(self.client.get("/registry/" + sPidName, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']).status_code, 304)
+            self.assertEqual(self.client.get("/registry/unknown").status_code, 404)
+        # Newly published files are picked up
+        descr = make_descriptor(self.user, "oh2")
+        self.assertEqual(self.client.get("/registry/" + descr.pidname).status_code, 404)
+        self.publish()
+        response = self.client.get("/registry/" + descr.pidname)
+        self.assertEqual(response.status_code, 200)
+        response.close()
+
+    def test_registry_delete(self):
+        """A deleted descriptor leaves the registry, and the archives are rebuilt without it."""
+        make_descriptor(self.user, "oh2")
+        self.publish()
+        sPidName = Descriptor.objects.get(id=self.descr.id).pidname
+        fPublish = get_publish_file(sPidName)
+        self.assertTrue(archives_current())
+        with self.captureOnCommitCallbacks(execute=True):
+            Descriptor.objects.get(id=self.descr.id).delete()
+        self.assertFalse(os.path.exists(fPublish))
+        self.assertFalse(os.path.exists(fPublish + ".gz"))
+        self.assertEqual(self.client.get("/registry/" + sPidName).status_code, 404)
+        # The old archives are not handed out any more
+        self.assertFalse(archives_current())
+        self.assertTrue(update_archives())
+        with zipfile.ZipFile(get_archive_file('zip')) as archive:
+            self.assertEqual(archive.namelist(), ["oh2.xml"])
+
+    def test_registry_gzip(self):
+        """A precompressed copy is kept next to each published file and served to clients that accept it."""
+        self.publish()
+        sPidName = Descriptor.objects.get(id=self.descr.id).pidname
+        with open(get_publish_file(sPidName) + ".gz", mode="rb") as f:
+            self.assertEqual(gzip.decompress(f.read()).decode("utf-8"), EXPECTED_XML)
+        response = self.client.get("/registry/" + sPidName, HTTP_ACCEPT_ENCODING="gzip, deflate")
+        self.assertEqual(response['Content-Encoding'], "gzip")
+        self.assertIn("Accept-Encoding", response['Vary'])
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)).decode("utf-8"), EXPECTED_XML)
+        response.close()
+        response = self.client.get("/registry/" + sPidName)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        response.close()
+
+    def test_output(self):
+        """/output answers repeated requests with 304, using the cached XML."""
+        response = self.client.get("/output/{}".format(self.descr.id), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(gzip.decompress(response.content).decode("utf-8"), EXPECTED_XML)
+        with mock.patch("asrbank.transcription.export.create_descriptor_xml") as create:
+            response = self.client.get("/output/{}".format(self.descr.id), HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(response.status_code, 304)
+            response = self.client.get("/output/{}".format(self.descr.id), HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+            self.assertEqual(response.status_code, 304)
+            self.assertFalse(create.called)
+        # A change in the vocabulary is a change of the XML too
+        sModified = response['Last-Modified']
+        with mock.patch("asrbank.transcription.models.timezone.now", return_value=timezone.now() + timedelta(days=1)):
+            FieldChoice.objects.filter(field=INTERVIEW_GENRE).get().save()
+        response = self.client.get("/output/{}".format(self.descr.id), HTTP_IF_MODIFIED_SINCE=sModified)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['Last-Modified'], sModified)
+        # A change gives a new ETag
+        Topic.objects.create(name="home", descriptor=self.descr)
+        response = self.client.get("/output/{}".format(self.descr.id), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertContains(response, "<Topic>home</Topic>")
+
+    def test_unique(self):
+        """Pidnames are unique, and so are identifiers per owner."""
+        with self.assertRaises(IntegrityError):
+            with transaction.atomic():
+                make_descriptor(self.user, "oh1")
+        make_descriptor(User.objects.create(username="other"), "oh1")
+        with self.assertRaises(IntegrityError):
+            Descriptor.objects.filter(identifier="oh1").update(pidname="same")
+
+    def test_unique_admin(self):
+        """A normal user who reuses an identifier gets a form error, not a server error."""
+        self.user.is_staff = True
+        self.user.save()
+        self.user.user_permissions.add(*Permission.objects.filter(codename__in=['add_descriptor', 'change_descriptor']))
+        self.client.force_login(self.user)
+        sUrl = "/admin/transcription/descriptor/add/"
+        response = self.client.get(sUrl)
+        # Empty inlines, with their management forms
+        oData = {'identifier': "oh1", 'access': "1", 'landingPage': "http://example.com/", 'projectTitle': "t", 'interviewId': "i",
+                 'interviewDate': "2017-03-30", 'interviewLength': "00:00:00", 'copyright': "", 'modality': "1"}
+        for oInline in response.context['inline_admin_formsets']:
+            for oField in oInline.formset.management_form:
+                oData[oField.html_name] = oField.value()
+            oData[oInline.formset.prefix + "-TOTAL_FORMS"] = 0
+        response = self.client.post(sUrl, oData)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "You already have a metadata record with this identifier")
+        self.assertEqual(Descriptor.objects.filter(identifier="oh1").count(), 1)
+        # A new identifier is fine
+        oData['identifier'] = "oh2"
+        response = self.client.post(sUrl, oData)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Descriptor.objects.get(identifier="oh2").owner, self.user)
+
+    def test_publish_command(self):
+        """manage.py publish handles a selection in batches and can be run again."""
+        oOther = User.objects.create(username="other")
+        make_descriptor(oOther, "oh2")
+        make_descriptor(self.user, "oh3")
+        out = io.StringIO()
+        call_command("publish", owner=["owner"], jobs=1, batch=1, base_url="http://testserver", stdout=out)
+        self.assertIn("2/2 descriptors: 2 written", out.getvalue())
+        self.assertEqual(Descriptor.objects.exclude(published=None).count(), 2)
+        # The XML is the same as when publishing from the web
+        with open(get_publish_file(Descriptor.objects.get(id=self.descr.id).pidname), encoding="utf-8") as f:
+            self.assertEqual(f.read(), EXPECTED_XML)
+        # Running again only does what is left
+        out = io.StringIO()
+        call_command("publish", jobs=1, base_url="http://testserver", stdout=out)
+        self.assertIn("3/3 descriptors: 1 written, 0 unchanged, 2 up to date", out.getvalue())
+        out = io.StringIO()
+        call_command("publish", modified_since="2000-01-01", id_from=self.descr.id + 1, jobs=1, stdout=out)
+        self.assertIn("2/2 descriptors: 0 written, 0 unchanged, 2 up to date", out.getvalue())
+
+    def test_publish_command_pool(self):
+        """manage.py publish starts its worker processes once, and holds no transaction while generating XML."""
+        shutdown_export_pools()
+        self.addCleanup(shutdown_export_pools)
+        make_descriptor(self.user, "oh2")
+        make_descriptor(self.user, "oh3")
+        # The test itself runs in atomic blocks; the command must not add any
+        iBlocks = len(connection.atomic_blocks)
+        lBlocks = []
+
+        def generate(qs, request, iJobs=None, executor=None):
+            lBlocks.append(len(connection.atomic_blocks))
+            return generate_descriptor_xml(qs, request, iJobs, executor)
+
+        out = io.StringIO()
+        with mock.patch("asrbank.transcription.export.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as pool, \
+             mock.patch("asrbank.transcription.publish.generate_descriptor_xml", side_effect=generate):
+            call_command("publish", jobs=2, batch=1, base_url="http://testserver", stdout=out)
+        self.assertEqual(pool.call_count, 1)
+        # Later exports in the same process use the same workers
+        with mock.patch("asrbank.transcription.export.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as pool:
+            list(generate_descriptor_xml(Descriptor.objects.filter(id=self.descr.id), self.request, 2))
+        self.assertEqual(pool.call_count, 0)
+        self.assertEqual(lBlocks, [iBlocks] * 3)
+        self.assertIn("3/3 descriptors: 3 written", out.getvalue())
+        self.assertEqual(Descriptor.objects.exclude(published=None).count(), 3)
+
+    def test_archives(self):
+        """The registry archives are only rebuilt when the published records change."""
+        self.assertTrue(self.publish()['archives'])
+        with zipfile.ZipFile(get_archive_file('zip')) as archive:
+            self.assertEqual(archive.read("oh1.xml").decode("utf-8"), EXPECTED_XML)
+        with tarfile.open(get_archive_file('tar'), mode="r:gz") as tar:
+            self.assertEqual(tar.extractfile("oh1.xml").read().decode("utf-8"), EXPECTED_XML)
+        self.assertFalse(self.publish()['archives'])
+        make_descriptor(self.user, "oh2")
+        self.assertTrue(self.publish()['archives'])
+        with zipfile.ZipFile(get_archive_file('zip')) as archive:
+            self.assertEqual(archive.namelist(), ["oh1.xml", "oh2.xml"])
+
+
+class ArchiveTest(TestCase):
+    """Tests for the streaming archives."""
+
+    def setUp(self):
+        make_vocabulary()
+        self.descr = make_descriptor(User.objects.create(username="owner"))
+        self.request = RequestFactory().get("/")
+
+    def test_stream_zip(self):
+        """Every entry is yielded as soon as it has been written."""
+        lEntries = [("a.xml", b"<a/>"), ("b.xml", b"<b/>" * 1000)]
+        lChunks = list(stream_zip(iter(lEntries)))
+        # One chunk per entry plus the central directory
+        self.assertEqual(len(lChunks), 3)
+        with zipfile.ZipFile(io.BytesIO(b"".join(lChunks))) as archive:
+            self.assertEqual([(info.filename, archive.read(info)) for info in archive.infolist()], lEntries)
+            # Sizes follow the data in a data descriptor
+            self.assertTrue(all(info.flag_bits & 0x08 for info in archive.infolist()))
+
+    def test_stream_tar(self):
+        lEntries = [("a.xml", b"<a/>"), ("b.xml", os.urandom(50000)), ("c.xml", os.urandom(50000))]
+        lChunks = list(stream_tar(iter(lEntries)))
+        # Incompressible entries are sent before the archive is complete
+        self.assertGreater(len(lChunks), 2)
+        with tarfile.open(fileobj=io.BytesIO(b"".join(lChunks)), mode="r:gz") as tar:
+            self.assertEqual([(info.name, tar.extractfile(info).read()) for info in tar.getmembers()], lEntries)
+
+    def test_descriptor_entries(self):
+        with mock.patch("asrbank.transcription.export.getSchema", return_value=etree.XMLSchema(etree.XML(PERMISSIVE_XSD))):
+            lEntries = list(descriptor_entries(Descriptor.objects.all(), self.request))
+        self.assertEqual(lEntries, [("oh1.xml", EXPECTED_XML.encode("utf-8"))])
+
+
+class DeliveryTest(TestCase):
+    """Tests for sending files with ETag and Range support."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.file = os.path.join(self.dir.name, "data.bin")
+        self.data = bytes(range(256)) * 4
+        with open(self.file, mode="wb") as f:
+            f.write(self.data)
+        self.factory = RequestFactory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def send(self, **kwargs):
+        response = file_response(self.factory.get("/", **kwargs), self.file, "application/zip", "data.zip")
+        sBody = b"".join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return (response, sBody)
+
+    def test_full(self):
+        (response, sBody) = self.send()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sBody, self.data)
+        self.assertEqual(response['Content-Length'], str(len(self.data)))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="data.zip"')
+        # The same version of the file need not be sent again
+        (response, sBody) = self.send(HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_sendfile(self):
+        """The front-end server can be asked to send the file."""
+        with mock.patch("asrbank.transcription.delivery.FILE_DELIVERY", "x-sendfile"):
+            (response, sBody) = self.send()
+        self.assertEqual((response['X-Sendfile'], sBody), (self.file, b""))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="data.zip"')
+        with mock.patch("asrbank.transcription.delivery.FILE_DELIVERY", "x-accel-redirect"), \
+             mock.patch("asrbank.transcription.delivery.FILE_DELIVERY_ROOT", self.dir.name), \
+             mock.patch("asrbank.transcription.delivery.FILE_DELIVERY_URL", "/protected/"):
+            (response, sBody) = self.send()
+            self.assertEqual(response['X-Accel-Redirect'], "/protected/data.bin")
+            # Files elsewhere are still sent by Python
+            with mock.patch("asrbank.transcription.delivery.FILE_DELIVERY_ROOT", os.path.join(self.dir.name, "sub")):
+                self.assertEqual(self.send()[1], self.data)
+
+    def test_range(self):
+        (response, sBody) = self.send(HTTP_RANGE="bytes=1000-")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(sBody, self.data[1000:])
+        self.assertEqual(response['Content-Range'], "bytes 1000-1023/1024")
+        self.assertEqual(self.send(HTTP_RANGE="bytes=-4")[1], self.data[-4:])
+        self.assertEqual(self.send(HTTP_RANGE="bytes=10-19")[1], self.data[10:20])
+        self.assertEqual(self.send(HTTP_RANGE="bytes=2000-")[0].status_code, 416)
+        # A range of another version of the file gets the whole file
+        self.assertEqual(self.send(HTTP_RANGE="bytes=10-19", HTTP_IF_RANGE='"other"')[0].status_code, 200)
+
+
+class OverviewTest(TestCase):
+    """Tests for the overview page."""
+
+    def setUp(self):
+        make_vocabulary()
+        self.user = User.objects.create(username="owner")
+        for sIdentifier in ["e", "B", "a", "D", "c", "g", "F"]:
+            make_descriptor(self.user, sIdentifier)
+        self.client.force_login(self.user)
+
+    def walk(self, oParams, sDirection='after'):
+        lPages = []
+        while True:
+            response = self.client.get("/overview/", oParams)
+            oPage = response.context['page']
+            lPages.append([oRow['identifier'] for oRow in oPage['rows']])
+            sCursor = oPage['next'] if sDirection == 'after' else oPage['previous']
+            if sCursor == None:
+                return (lPages, response)
+            oParams = dict(oParams)
+            oParams.pop('after', None)
+            oParams.pop('before', None)
+            oParams[sDirection] = sCursor
+
+    def test_keyset_pages(self):
+        (lPages, response) = self.walk({'size': 3})
+        self.assertEqual(lPages, [["a", "B", "c"], ["D", "e", "F"], ["g"]])
+        # And back again from the last page
+        oLast = response.context['page']
+        (lPages, response) = self.walk({'size': 3, 'before': oLast['previous']}, 'before')
+        self.assertEqual(lPages, [["D", "e", "F"], ["a", "B", "c"]])
+        # Descending order
+        (lPages, response) = self.walk({'size': 4, 'o': -2})
+        self.assertEqual(lPages, [["g", "F", "e", "D"], ["c", "B", "a"]])
+        self.assertContains(response, "o=-2&amp;before=")
+
+    def test_projected_rows(self):
+        """Only the displayed columns and the owner's username are fetched."""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/overview/", {'size': 2, 'o': 3})
+        lRows = response.context['page']['rows']
+        self.assertEqual(set(lRows[0].keys()), {'id', 'identifier', 'projectTitle', 'interviewDate', 'owner_name', 'sort_key'})
+        self.assertEqual(lRows[0]['owner_name'], "owner")
+        self.assertContains(response, "<td>owner</td>", count=2)
+        sSql = [oQuery['sql'] for oQuery in queries.captured_queries if '"transcription_descriptor"."identifier"' in oQuery['sql']][0]
+        self.assertNotIn("copyright", sSql)
+        self.assertNotIn("last_login", sSql)
+
+    def test_index_used(self):
+        """A deep page is a range search on the (owner, lower(identifier), id) index, not a scan."""
+        qs = Descriptor.objects.filter(owner=self.user).annotate(sort_key=Lower('identifier'))
+        sPlan = qs.filter(seek_filter("c", 5)).order_by('sort_key', 'id')[:3].explain()
+        self.assertIn("descriptor_owner_identifier_ci", sPlan)
+        self.assertIn(">?", sPlan)
+        self.assertNotIn("SCAN", sPlan)
+        # Dates are compared as they are, on the (interviewDate, id) index
+        qs = Descriptor.objects.annotate(sort_key=F('interviewDate'))
+        sPlan = qs.filter(seek_filter("2017-03-30", 5, False)).order_by('-sort_key', '-id')[:3].explain()
+        self.assertIn("descriptor_date", sPlan)
+        self.assertNotIn("SCAN", sPlan)
+
+    def test_date_order(self):
+        """The Date column sorts on the date itself."""
+        Descriptor.objects.filter(identifier="a").update(interviewDate="2020-05-01")
+        Descriptor.objects.filter(identifier="c").update(interviewDate="1999-12-31")
+        (lPages, response) = self.walk({'size': 3, 'o': 5})
+        lIdentifiers = sum(lPages, [])
+        self.assertEqual((lIdentifiers[0], lIdentifiers[-1], len(lIdentifiers)), ("c", "a", 7))
+
+
+class SearchTest(TestCase):
+    """Tests for the full-text index."""
+
+    def setUp(self):
+        make_vocabulary()
+        self.user = User.objects.create(username="owner")
+        # The index is brought up to date when the transaction is committed
+        with self.captureOnCommitCallbacks(execute=True):
+            self.descr = make_descriptor(self.user, "oh1")
+            self.other = make_descriptor(self.user, "war")
+            Interviewee.objects.create(code="Z", name="Zoë Müller", gender="1", age="70", descriptor=self.descr)
+
+    def count_rows(self):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM " + SEARCH_TABLE)
+            return cursor.fetchone()[0]
+
+    def test_index_follows_changes(self):
+        # Case and diacritics are folded, words may be prefixes
+        self.assertEqual(search_descriptors("zoe MULLER"), [self.descr.id])
+        self.assertEqual(set(search_descriptors("nijm")), {self.descr.id, self.other.id})
+        self.assertEqual(search_descriptors('" OR *'), [])
+        Topic.objects.filter(descriptor=self.other, name="peace").update(name="-")
+        with self.captureOnCommitCallbacks(execute=True):
+            Topic.objects.create(name="Bevrijding", descriptor=self.other)
+            # Nothing changes before the commit
+            self.assertEqual(search_descriptors("bevrijding"), [])
+        self.assertEqual(search_descriptors("bevrijding"), [self.other.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.username = "historian"
+            self.user.save()
+        self.assertEqual(len(search_descriptors("historian")), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.delete()
+        self.assertEqual(self.count_rows(), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.delete()
+        self.assertEqual(self.count_rows(), 0)
+
+    def test_index_once(self):
+        """A descriptor is indexed once per transaction, however many of its rows change."""
+        with mock.patch("asrbank.transcription.search.index_descriptors", wraps=index_descriptors) as index:
+            with self.captureOnCommitCallbacks(execute=True):
+                for sName in ["home", "school", "work"]:
+                    Topic.objects.create(name=sName, descriptor=self.descr)
+                Descriptor.objects.get(id=self.descr.id).save()
+                Topic.objects.create(name="church", descriptor=self.other)
+        self.assertEqual(index.call_args_list, [mock.call([self.descr.id, self.other.id])])
+        self.assertEqual(search_descriptors("school"), [self.descr.id])
+
+    def test_ranking(self):
+        """An identifier match counts for more than a topic match."""
+        self.assertEqual(search_descriptors("war"), [self.other.id, self.descr.id])
+
+    def test_searchable(self):
+        """HelpChoice decides which fields are in the index."""
+        with self.captureOnCommitCallbacks(execute=True):
+            oHelp = HelpChoice.objects.create(field=PARTICIPANT_NAME, display_name="Name", searchable=False)
+        # The index is rebuilt by the job worker
+        self.assertEqual(Job.objects.filter(kind='index', status='queued').count(), 1)
+        self.assertEqual(search_descriptors("zoe"), [self.descr.id])
+        self.assertEqual(run_jobs(bOnce=True), 1)
+        self.assertEqual(json.loads(Job.objects.get(kind='index').result), {'indexed': 2})
+        self.assertEqual(search_descriptors("zoe"), [])
+        self.assertEqual(search_descriptors("Z"), [self.descr.id])
+        # A change that leaves the searchable fields alone needs no rebuild
+        with self.captureOnCommitCallbacks(execute=True):
+            oHelp.display_name = "Full name"
+            oHelp.save()
+            HelpChoice.objects.create(field="unknown.field", display_name="Other", searchable=True)
+        self.assertFalse(Job.objects.filter(kind='index', status='queued').exists())
+        with self.captureOnCommitCallbacks(execute=True):
+            oHelp.searchable = True
+            oHelp.save()
+        run_jobs(bOnce=True)
+        self.assertEqual(search_descriptors("zoe"), [self.descr.id])
+
+    def test_views(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/overview/", {'q': "zoë", 'o': 2})
+        self.assertEqual([oRow['identifier'] for oRow in response.context['page']['rows']], ["oh1"])
+        self.assertEqual(response.context['page_query'], "o=2&q=zo%C3%AB")
+        # Only published descriptors can be found in the registry
+        self.assertEqual(self.client.get("/search/", {'q': "nijmegen"}).json()['results'], [])
+        Descriptor.objects.filter(id=self.other.id).update(published=timezone.now())
+        oResult = self.client.get("/search/", {'q': "nijmegen"}).json()['results']
+        self.assertEqual([oRow['identifier'] for oRow in oResult], ["war"])
+        self.assertEqual(oResult[0]['url'], "/registry/" + make_pidname(self.other.id))
+        # A descriptor that is gone by the time its row is read is left out
+        with mock.patch("asrbank.transcription.views.search_descriptors", return_value=[self.other.id + 100, self.other.id]):
+            oResult = self.client.get("/search/", {'q': "nijmegen"}).json()['results']
+        self.assertEqual([oRow['identifier'] for oRow in oResult], ["war"])
+
+    def test_admin(self):
+        self.user.is_staff = self.user.is_superuser = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get("/admin/transcription/descriptor/", {'q': "muller"})
+        self.assertEqual(list(response.context['cl'].result_list), [self.descr])
+
+
+class FacetTest(TestCase):
+    """Tests for the facets of the overview."""
+
+    def setUp(self):
+        make_vocabulary()
+        FieldChoice.objects.create(field=INTERVIEW_GENRE, english_name="lecture", dutch_name="lezing", machine_value=2)
+        self.user = User.objects.create(username="owner")
+        self.first = make_descriptor(self.user, "a")
+        self.second = make_descriptor(self.user, "b")
+        make_descriptor(User.objects.create(username="other"), "c")
+        Genre.objects.create(name="2", descriptor=self.second)
+        Language.objects.filter(descriptor=self.second).update(name="3")
+        self.client.force_login(self.user)
+
+    def get_facets(self, oParams):
+        response = self.client.get("/overview/", oParams)
+        oFacets = {}
+        for oFacet in response.context['facets']:
+            oFacets[oFacet['key']] = [(oItem['label'], oItem['count'], oItem['selected']) for oItem in oFacet['values']]
+        return (oFacets, [oRow['identifier'] for oRow in response.context['page']['rows']], response)
+
+    def test_counts(self):
+        (oFacets, lRows, response) = self.get_facets({})
+        # Only the descriptors of the user are counted; values without a label are shown as they are
+        self.assertEqual(oFacets['genre'], [("interviews", 2, False), ("lecture", 1, False)])
+        self.assertEqual(oFacets['language'], [("Dutch", 1, False), ("3", 1, False)])
+        self.assertEqual(oFacets['annotation'], [("orthographicTranscription", 2, False)])
+        self.assertEqual(lRows, ["a", "b"])
+
+    def test_selection(self):
+        (oFacets, lRows, response) = self.get_facets({'genre': "2", 'o': 2})
+        self.assertEqual(lRows, ["b"])
+        # The counts of a facet leave out its own choice, those of the others do not
+        self.assertEqual(oFacets['genre'], [("interviews", 2, False), ("lecture", 1, True)])
+        self.assertEqual(oFacets['language'], [("3", 1, False)])
+        self.assertEqual(response.context['page_query'], "o=2&genre=2")
+        self.assertContains(response, 'href="?genre=2&amp;genre=1&amp;o=2"')
+        # Values of one facet are combined with OR, facets with AND
+        (oFacets, lRows, response) = self.get_facets({'genre': ["2", "1"], 'language': "1"})
+        self.assertEqual(lRows, ["a"])
+
+    def test_filters(self):
+        """The counts follow the search and the year range of the overview."""
+        with self.captureOnCommitCallbacks(execute=True):
+            Topic.objects.create(name="lecturing", descriptor=self.second)
+        TemporalCoverage.objects.filter(descriptor=self.second).update(startYearValue=1960, endYearValue=1970)
+        (oFacets, lRows, response) = self.get_facets({'q': "lecturing"})
+        self.assertEqual(lRows, ["b"])
+        self.assertEqual(oFacets['genre'], [("interviews", 1, False), ("lecture", 1, False)])
+        self.assertEqual(oFacets['language'], [("3", 1, False)])
+        (oFacets, lRows, response) = self.get_facets({'from': "1940", 'to': "1950"})
+        self.assertEqual(lRows, ["a"])
+        self.assertEqual(oFacets['genre'], [("interviews", 1, False)])
+        # Without the filters the counts are those of all descriptors again
+        (oFacets, lRows, response) = self.get_facets({})
+        self.assertEqual(oFacets['genre'], [("interviews", 2, False), ("lecture", 1, False)])
+
+    def test_cache(self):
+        self.get_facets({})
+        with CaptureQueriesContext(connection) as queries:
+            (oFacets, lRows, response) = self.get_facets({})
+        # The counts come from the cache: only the data version is asked for
+        self.assertEqual(len([oQuery for oQuery in queries.captured_queries if "transcription_genre" in oQuery['sql']]), 0)
+        Genre.objects.create(name="2", descriptor=self.first)
+        (oFacets, lRows, response) = self.get_facets({})
+        self.assertEqual(oFacets['genre'], [("interviews", 2, False), ("lecture", 2, False)])
+
+
+class TemporalTest(TestCase):
+    """Tests for the year numbers of the temporal coverages."""
+
+    def setUp(self):
+        make_vocabulary()
+        self.user = User.objects.create(username="owner")
+        # 1940-1945 (from make_descriptor), 1930-unknown, unknown-unknown, 1950-1960
+        self.war = make_descriptor(self.user, "war")
+        self.thirties = make_descriptor(self.user, "thirties")
+        TemporalCoverage.objects.filter(descriptor=self.thirties).update(startYear="1930", endYear="unknown")
+        for cov_this in TemporalCoverage.objects.filter(descriptor=self.thirties):
+            cov_this.save()
+        self.unknown = make_descriptor(self.user, "unknown")
+        cov_this = TemporalCoverage.objects.get(descriptor=self.unknown)
+        cov_this.startYear = cov_this.endYear = "-"
+        cov_this.save(update_fields=['startYear', 'endYear'])
+        self.fifties = make_descriptor(self.user, "fifties")
+        TemporalCoverage.objects.filter(descriptor=self.fifties).delete()
+        TemporalCoverage.objects.create(startYear="1950", endYear="1960", descriptor=self.fifties)
+
+    def covering(self, iFrom, iTo):
+        return sorted(Descriptor.objects.filter(temporal_filter(iFrom, iTo)).values_list('identifier', flat=True))
+
+    def test_year_values(self):
+        self.assertEqual(get_year_range("1940", "1945"), (1940, 1945))
+        self.assertEqual(get_year_range("unknown", " 1945 "), (1945, 1945))
+        self.assertEqual(get_year_range("-", "unknown"), (None, None))
+        self.assertEqual(list(TemporalCoverage.objects.filter(descriptor=self.unknown).values_list(
+            'startYearValue', 'endYearValue')), [(None, None)])
+
+    def test_overlap(self):
+        self.assertEqual(self.covering(1944, 1951), ["fifties", "war"])
+        self.assertEqual(self.covering(1930, 1930), ["thirties"])
+        self.assertEqual(self.covering(1946, 1949), [])
+        self.assertEqual(self.covering(None, 1940), ["thirties", "war"])
+        self.assertEqual(self.covering(None, None), ["fifties", "thirties", "war"])
+        qs = temporal_overlap(1940, 1945)
+        self.assertIn("temporalcoverage_years", qs.explain())
+
+    def test_overview(self):
+        self.client.force_login(self.user)
+        response = self.client.get("/overview/", {'from': "1955", 'to': "nonsense"})
+        self.assertEqual([oRow['identifier'] for oRow in response.context['page']['rows']], ["fifties"])
+        self.assertEqual(response.context['filter_query'], "from=1955")
@@ -43,7 +43,11 @@ urlpatterns = [
     re_path(r'^overview/$', DescriptorListView.as_view(),{'type': 'list'}, name='overview'),
     re_path(r'^publish/$', DescriptorListView.as_view(), {'type': 'publish'},name='publish'),
     re_path(r'^output/(?P<pk>\d+)$', DescriptorDetailView.as_view(), {'type': 'output'}, name='output'),
-    re_path(r'^registry/(?P<slug>[-\w]+)$', DescriptorDetailView.as_view(), {'type': 'registry'}, name='registry'),
+    re_path(r'^registry/(?P<slug>[-\w]+)$', asrbank.transcription.views.registry, name='registry'),
+    re_path(r'^search/$', asrbank.transcription.views.search, name='search'),
+    re_path(r'^jobs/(?P<pk>\d+)/$', JobDetailView.as_view(), name='job'),
+    re_path(r'^jobs/(?P<pk>\d+)/status$', asrbank.transcription.views.job_status, name='job_status'),
+    re_path(r'^jobs/(?P<pk>\d+)/download$', asrbank.transcription.views.job_download, name='job_download'),
     re_path(r'^signup/$', asrbank.transcription.views.signup, name='signup'),
 
     re_path(r'^login/$', LoginView.as_view